@@ -2,10 +2,10 @@ import os
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from cmdstanpy import CmdStanModel
 
 args = {}
 args['seed'] = 1234
+args['shards_per_chain'] = 4
 args['main'] = Path(__file__).resolve()
 args['cwd'] = args['main'].parent.parent
 args['stan_dir'] = args['cwd'] / 'model' / 'bnb'
@@ -18,31 +18,22 @@ args['hpp'] = args['cwd'] / 'src' / 'cpp' / 'bnb.hpp'
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import stan_model, merge_hdi, make_fitting_data
+from sharded_gq import run_sharded_gq
 
 stan_data_0 = make_fitting_data(args['derived_dir'] / 'df_full.csv')
 args['bnb_gp_awgtr'] = args['stan_dir'] / 'bnb_gp_awgtr.stan'
-bnb_model = stan_model(args['bnb_gp_awgtr'], recover=True, 
+# only the CSV files of the fit are needed, so no draws cache is written
+bnb_model = stan_model(args['bnb_gp_awgtr'], recover=True, use_cache=False,
                             stan_data=stan_data_0, stan_save_dir=args['output_dir'] / 'bnb_gp_awgtr_save')
 
 
-# when calling external C++ code, Stan requires
-# the name of the corresponding namespace should be modified to the model file name
-tmp =  stan_model(args['stan_dir'] / 'gen_quant.stan')
-for file in Path(args['hpp'].parent / 'bnb').rglob('*.hpp'):
-    tmp.change_namespace(file)
-del tmp
-
-model_gen = CmdStanModel(stan_file=args['stan_dir'] / 'gen_quant.stan', 
-                         compile=False, stanc_options=args['stanc_args'])
-model_gen.compile(user_header=args['hpp'], )
-new_quantities = model_gen.generate_quantities(data=stan_data_0, 
-                                               previous_fit=bnb_model.fit,
-                                               gq_output_dir=args['output_dir'] / 'bnb_gp_awgtr_gen',
-                                               show_console=True,
-                                               seed=args['seed'])
-
-sample_gen = new_quantities.draws_xr(inc_sample=False)
-sample_gen.to_netcdf(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
-
-# sample_plus = new_quantities.draws_xr(inc_sample=True)
-# sample_plus.to_netcdf(args['output_dir'] / 'bnb_gp_awgtr_all.nc')
\ No newline at end of file
+# compile builds gen_quant with its own copy of the user header in the gen_quant namespace
+gen_model = stan_model(args['stan_dir'] / 'gen_quant.stan')
+gen_model.compile(user_header=args['hpp'], stanc_options=args['stanc_args'])
+# every chain is split into shards of draws run by concurrent generate_quantities processes; running
+# the script again after an interruption only runs the shards that did not finish
+run_sharded_gq(gen_model, stan_data_0, sorted(bnb_model.csv_files),
+               output_dir=args['output_dir'] / 'bnb_gp_awgtr_gen',
+               store=args['output_dir'] / 'bnb_gp_awgtr_gen.zarr',
+               shards_per_chain=args['shards_per_chain'],
+               seed=args['seed'])
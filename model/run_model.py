@@ -23,5 +23,7 @@ bnb_model.sample(stan_data_0,
                  **{"chains": 4, "iter_warmup": 1000, "iter_sampling": 1000, 
                     "show_console": True, "seed": args['seed'], "refresh": 10})
 bnb_model.save(args['output_dir'] / 'bnb_gp_awgtr_save')
+bnb_model.to_draw_store(args['output_dir'] / 'bnb_gp_awgtr.zarr', exclude=['log_lik', 'y_hat'])
 print(bnb_model.fit.diagnose())
+print(bnb_model.loo)
 
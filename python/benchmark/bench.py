@@ -0,0 +1,123 @@
+# Benchmark suite for the distribution helpers in src/python and the BNB Stan/C++ kernels.
+# Results are written to data/output/benchmark/ as JSON and compared against baseline.json.
+#
+#   python python/benchmark/bench.py                    # run and compare against the baseline
+#   python python/benchmark/bench.py --update-baseline  # run and store the result as new baseline
+#   python python/benchmark/bench.py --max-size 100000 --no-stan
+
+import os
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+
+args = {}
+args['seed'] = 1234
+current_file = Path(__file__).resolve()
+args['main'] = str(current_file)
+args['cwd'] = current_file.parent.parent.parent
+args['profile_dir'] = args['cwd'] / 'python' / 'profile_stan' / 'profStan'
+args['bench_dir'] = args['cwd'] / 'data' / 'output' / 'benchmark'
+args['baseline'] = args['bench_dir'] / 'baseline.json'
+args['sizes'] = [10**3, 10**4, 10**5, 10**6, 10**7]
+args['stan_sizes'] = [10**3, 10**4, 10**5]
+args['stan_sample_args'] = {"iter_warmup": 200, "iter_sampling": 200, "chains": 1, "seed": args['seed'], "show_progress": False}
+args['stanc_args'] = {"include-paths": [str(args['cwd'] / 'src')]}
+args['hpp'] = args['cwd'] / 'src' / 'cpp' / 'bnb.hpp'
+
+sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
+import utils
+from utils import (beta_negative_binomial_rng, beta_neg_binomial_cdf, zipf_cdf, zipf_harmonic_table,
+                   poi_mle_fit, nb_mle_fit, bnb_mle_fit, trunc_bnb_summary)
+from benchmark import run_cases, save_results, load_results, compare_results
+
+parser = argparse.ArgumentParser(description="Benchmark the BNB and Zipf distribution helpers.")
+parser.add_argument("--max-size", type=int, default=max(args['sizes']), help="largest problem size to run")
+parser.add_argument("--repeat", type=int, default=3, help="timed runs per case after one warm-up run, the best is kept")
+parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as regression")
+parser.add_argument("--no-stan", action="store_true", help="skip the compiled BNB_cpp/BNB_stan models")
+parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+cli = parser.parse_args()
+
+
+# -------------------------- python distribution helpers --------------------------
+
+def python_cases(sizes):
+    rng = np.random.default_rng(args['seed'])
+    for n in sizes:
+        y = rng.integers(0, 201, n)
+        x = rng.integers(1, 10**4 + 1, n)
+        samples = beta_negative_binomial_rng(6, 2, 0.5, size=n, seed=args['seed'])
+        yield ("beta_neg_binomial_cdf", n, lambda y=y: beta_neg_binomial_cdf(y, 6, 2, 0.5))
+        yield ("zipf_cdf", n, lambda x=x: zipf_cdf(x, 2.2, 10**4), zipf_harmonic_table.cache_clear)
+        yield ("poi_mle_fit", n, lambda s=samples: poi_mle_fit(s))
+        yield ("nb_mle_fit", n, lambda s=samples: nb_mle_fit(s))
+        yield ("bnb_mle_fit", n, lambda s=samples: bnb_mle_fit(s))
+        if n <= 10**5:
+            a = rng.gamma(2, 1, n)
+            yield ("trunc_bnb_summary", n, lambda a=a: trunc_bnb_summary(a, 1.5, 0.5, 200))
+
+def numba_cases(sizes):
+    try:
+        import bnb_numba
+    except ImportError:
+        print("numba is not installed, skip the numba kernels")
+        return
+    rng = np.random.default_rng(args['seed'])
+    for n in sizes:
+        y = rng.integers(0, 201, n)
+        r = rng.gamma(2, 3, n)
+        yield ("bnb_numba_lpmf", n, lambda y=y, r=r: bnb_numba.beta_neg_binomial_lpmf(y, r, 2.0, 0.5))
+
+
+# -------------------------- compiled Stan models --------------------------
+
+def stan_cases(sizes):
+    import pandas as pd
+    from utils import stan_model
+    for name in ['BNB_cpp', 'BNB_stan']:
+        model = stan_model(args['profile_dir'] / (name + '.stan'))
+        try:
+            model.compile(user_header=args['hpp'], stanc_options=args['stanc_args'])
+        except Exception as e:
+            print(f"cannot compile {name}, skip it: {e}")
+            continue
+        for n in sizes:
+            stan_data = {"N": n, "y": beta_negative_binomial_rng(6, 2, 0.5, size=n, seed=args['seed'])}
+
+            fits = []
+
+            def sample(model=model, stan_data=stan_data, fits=fits):
+                fits.append(model.model.sample(data=stan_data, save_profile=True, **args['stan_sample_args']))
+
+            def profile(fits=fits):
+                # time spent in the profile() blocks of the last run
+                profile = pd.read_csv(fits[-1].runset.profile_files[0])
+                profile = profile.groupby('name')['total_time'].sum()
+                return {"profile_" + key: float(value) for key, value in profile.items()}
+
+            yield (name, n, sample, None, profile)
+
+
+sizes = [n for n in args['sizes'] if n <= cli.max_size]
+cases = [*python_cases(sizes), *numba_cases(sizes)]
+if not cli.no_stan:
+    cases += list(stan_cases([n for n in args['stan_sizes'] if n <= cli.max_size]))
+results = run_cases(cases, repeat=cli.repeat)
+
+os.makedirs(args['bench_dir'], exist_ok=True)
+from datetime import datetime
+result_file = args['bench_dir'] / f"benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+save_results(results, result_file)
+print(f"results saved to {result_file}")
+
+if cli.update_baseline:
+    save_results(results, args['baseline'])
+    print(f"baseline updated: {args['baseline']}")
+elif os.path.exists(args['baseline']):
+    comparison = compare_results(results, load_results(args['baseline']), threshold=cli.threshold)
+    print(comparison.to_string(index=False))
+    if comparison['regression'].any():
+        sys.exit(1)
+else:
+    print("no baseline found, run with --update-baseline to create one")
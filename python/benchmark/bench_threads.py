@@ -0,0 +1,59 @@
+# Within-chain speedup of the reduce_sum likelihood of bnb_gp_awgtr_rs.
+# The model is built with STAN_THREADS and sampled on one chain with an increasing number of
+# threads. The time per gradient evaluation comes from its profile("likelihood") block.
+#
+#   python python/benchmark/bench_threads.py
+#   python python/benchmark/bench_threads.py --threads 1 2 4 8 16 32 --grainsize 500
+
+import os
+import sys
+import argparse
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+args = {}
+args['seed'] = 1234
+current_file = Path(__file__).resolve()
+args['main'] = str(current_file)
+args['cwd'] = current_file.parent.parent.parent
+args['derived_dir'] = args['cwd'] / 'data' / 'derived'
+args['bench_dir'] = args['cwd'] / 'data' / 'output' / 'benchmark'
+args['bnb_gp_awgtr_rs'] = args['cwd'] / 'model' / 'bnb' / 'bnb_gp_awgtr_rs.stan'
+args['stanc_args'] = {"include-paths": [str(args['cwd'] / 'src')]}
+args['hpp'] = args['cwd'] / 'src' / 'cpp' / 'bnb.hpp'
+
+sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
+from utils import stan_model, make_fitting_data
+
+cores = os.cpu_count() or 1
+parser = argparse.ArgumentParser(description="Benchmark the reduce_sum likelihood against the number of threads.")
+parser.add_argument("--threads", type=int, nargs="+", default=[2**i for i in range(cores.bit_length()) if 2**i <= cores],
+                    help="threads per chain to run, default powers of two up to the number of cores")
+parser.add_argument("--grainsize", type=int, default=1, help="reduce_sum grainsize, 1 lets the scheduler choose")
+parser.add_argument("--iter", type=int, default=100, help="warmup and sampling iterations")
+cli = parser.parse_args()
+
+stan_data_0 = make_fitting_data(args['derived_dir'] / 'df_full.csv')
+model = stan_model(args['bnb_gp_awgtr_rs'])
+model.compile(user_header=args['hpp'], stanc_options=args['stanc_args'], threads=True)
+
+rows = []
+for threads in cli.threads:
+    start = datetime.now()
+    model.sample(stan_data_0, grainsize=cli.grainsize, threads_per_chain=threads, chains=1,
+                 iter_warmup=cli.iter, iter_sampling=cli.iter, seed=args['seed'],
+                 save_profile=True, show_progress=False)
+    wall = (datetime.now() - start).total_seconds()
+    profile = pd.read_csv(model.fit.runset.profile_files[0])
+    likelihood = profile.loc[profile['name'] == 'likelihood'].sum(numeric_only=True)
+    rows.append((threads, cli.grainsize, wall, int(likelihood['autodiff_calls']),
+                 1000 * likelihood['total_time'] / likelihood['autodiff_calls']))
+    print(f"threads {threads:3d}: {rows[-1][-1]:.3f} ms per gradient, {wall:.1f} s wall time")
+
+result = pd.DataFrame(rows, columns=['threads', 'grainsize', 'wall_time', 'gradients', 'ms_per_gradient'])
+result['speedup'] = result['ms_per_gradient'].iloc[0] / result['ms_per_gradient']
+print(result)
+
+os.makedirs(args['bench_dir'], exist_ok=True)
+result.to_csv(args['bench_dir'] / f"threads_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv", index=False)
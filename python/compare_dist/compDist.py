@@ -17,13 +17,15 @@ args['name'] = current_file.stem
 args['root'] = current_file.parent.parent.parent
 args['derived_dir'] = args['root'] / "data" / 'derived'
 args['stan_dir'] = current_file.parent / args['name']
-args['sample_args'] = {"iter_warmup": 500, "iter_sampling": 500, "chains": 2, "seed": args['seed'], "show_console": True}
+args['sample_args'] = {"iter_warmup": 500, "iter_sampling": 500, "chains": 2, "seed": args['seed'], "show_console": False}
+args['cores'] = os.cpu_count()
 args['stanc_args'] = {"include-paths": [str(args['root'] / 'src')]}
 args['hpp'] = args['root'] / 'src' / 'cpp' / 'bnb.hpp'
 
 import sys
 sys.path.append(os.path.join(args['root'], 'src', 'python'))
 from utils import stan_model
+from scheduler import run_models
 
 
 df = pd.read_csv(os.path.join(args['derived_dir'], 'df_full.csv'))
@@ -39,33 +41,27 @@ stan_data_0 = {
     "y": data['nhh_nct'],
 }
 
-models = {}
+# compile all models concurrently, then sample them on the available cores
+jobs = {}
 for m in ['zipf_global', 'zipfmoe_global', 'zipfpe_global', 'zipfpl_global', ]:
-    print(m)
     args[m] = os.path.join(args['stan_dir'], m + '.stan')
-    models[m] = stan_model(args[m])
-    models[m].compile()
-    models[m].sample(stan_data, **args['sample_args'])
-    models[m].save()
+    jobs[m] = {"model": stan_model(args[m]), "data": stan_data}
 
 for m in ['zipfpss_global', 'nb_global', 'poi_global']:
-    print(m)
     args[m] = os.path.join(args['stan_dir'], m + '.stan')
-    models[m] = stan_model(args[m])
-    models[m].compile()
-    models[m].sample(stan_data_0, **args['sample_args'])
-    models[m].save()
+    jobs[m] = {"model": stan_model(args[m]), "data": stan_data_0}
 
 for m in ['bnb_global']:
-    print(m)
     args[m] = os.path.join(args['stan_dir'], m + '.stan')
-    models[m] = stan_model(args[m])
-    models[m].compile(user_header=args['hpp'], stanc_options=args['stanc_args'])
-    models[m].sample(stan_data_0, **args['sample_args'])
-    models[m].save()
+    jobs[m] = {"model": stan_model(args[m]), "data": stan_data_0,
+               "compile": {"user_header": args['hpp'], "stanc_options": args['stanc_args']}}
 
+models = {name: job["model"] for name, job in jobs.items()}
+az_data, timing = run_models(jobs, args['sample_args'], cores=args['cores'])
+print(timing)
 
-comp_df = az.compare({name: model.az_data for name, model in models.items()}, ic="loo")
+
+comp_df = az.compare(az_data, ic="loo")
 comp_df
 az.plot_compare(comp_df[0:-1], insample_dev=True, plot_ic_diff=True, 
                 backend='matplotlib', figsize=(8, 3))
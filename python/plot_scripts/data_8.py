@@ -17,7 +17,7 @@ args['fig_dir'] = args['cwd'] / "figures"
 
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
-from utils import poi_mle_fit, nb_mle_fit, bnb_mle_fit, beta_neg_binomial_cdf, zipf_cdf
+from utils import poi_mle_fit, nb_mle_fit, bnb_mle_fit, beta_neg_binomial_ccdf, zipf_ccdf
 
 # Load Data
 df_full = pd.read_csv(args['derived_dir'] / "df_full.csv")
@@ -113,11 +113,11 @@ for i,wg in enumerate(wave_group_levels):
     bnb_params = bnb_mle_fit(data)
     print(wg, bnb_params)
     zipf = powerlaw.Fit(data+1, discrete=True, xmin=1, xmax=np.Inf, fit_method='Likelihood')
-    fig.add_trace(go.Scatter(x=x_arr, y=1-beta_neg_binomial_cdf(x_arr, *bnb_params),
+    fig.add_trace(go.Scatter(x=x_arr, y=beta_neg_binomial_ccdf(x_arr, *bnb_params),
                             mode='lines', name='BetaNegBinom', line=dict(color=cols[i], dash='dash'),
                             showlegend=False))
     fig.add_trace(go.Scatter(x=x_arr, 
-                            y=1-zipf_cdf(x_arr, zipf.alpha, None),  #zipf.power_law.ccdf(x_arr),
+                            y=zipf_ccdf(x_arr, zipf.alpha, None),  #zipf.power_law.ccdf(x_arr),
                             mode='lines', name='Zipf', line=dict(color=cols[i], dash='dot'),
                             showlegend=False))
 fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', name="Data", line=dict(color="black")))
@@ -23,7 +23,7 @@ bnb_model = stan_model(args["bnb_gp_awgtr"], recover=True, stan_data=stan_data_0
 
 # -------------------------- Posterior distribution of ρ_r --------------------------
 
-df_rho = pd.DataFrame(bnb_model.fit.stan_variable("bnb_rho"))
+df_rho = pd.DataFrame(bnb_model.stan_variable("bnb_rho"))
 df_rho = df_rho.stack().reset_index()
 df_rho.columns = ["sample", "rp_nb", "bnb_rho"]
 
@@ -52,7 +52,7 @@ fig.write_image(args["fig_dir"] / "results" / "param_rho.pdf", format="pdf")
 
 # -------------------------- Posterior time effect f(t) --------------------------
 
-data = merge_hdi(bnb_model.fit, "gp_w_f")
+data = merge_hdi(bnb_model, "gp_w_f")
 data = data.rename(columns={"gp_w_f_dim_0": "wave"})
 data["wave"] = data["wave"] + 1
 
@@ -44,7 +44,7 @@ def get_trace(fit, name, position=None):
 variables = ['gp_a_l', 'gp_w_sigma', 'gp_a_l', 'gp_a_l', 'gp_a_sigma',]
 params = [('gp_a_l', [1,2]), ('gp_w_sigma', None), ('gp_a_l', [1,3]), ('gp_a_l', [0,4]), ('gp_a_sigma', [0,4])]
 
-traces = [get_trace(bnb_model.fit, k[0], k[1]) for k in params]
+traces = [get_trace(bnb_model, k[0], k[1]) for k in params]
 
 color_palette = px.colors.qualitative.Plotly
 fig = make_subplots(rows=5, cols=2, 
@@ -18,11 +18,12 @@ args['fig_dir'] = args['cwd'] / "figures"
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import merge_hdi
+from draw_store import open_draw_store
 
 
 # -------------------------- bnb_mu --------------------------
 
-xr_data = xr.open_dataset(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
+xr_data = open_draw_store(args['output_dir'] / 'bnb_gp_awgtr_gen.zarr', vars=['bnb_mu'])
 data = merge_hdi(xr_data, 'bnb_mu')
 data = data.rename(columns={'bnb_mu_dim_0':'gender', 'bnb_mu_dim_1':'age', 'bnb_mu_dim_2':'wave'})
 data['wave'] = data['wave'] + 1
@@ -19,11 +19,12 @@ args['fig_dir'] = args['cwd'] / "figures"
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import merge_hdi
+from draw_store import open_draw_store
 
 
 # -------------------------- Propotion of participants with 0 contacts --------------------------
 
-xr_data = xr.open_dataset(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
+xr_data = open_draw_store(args['output_dir'] / 'bnb_gp_awgtr_gen.zarr', vars=['zero'])
 data = merge_hdi(xr_data, 'zero')
 data = data.rename(columns={'zero_dim_0':'gender', 'zero_dim_1':'age', 'zero_dim_2':'wave', 'zero_dim_3':'repeat',})
 data['wave'] = data['wave'] + 1
@@ -21,6 +21,7 @@ args['fig_dir'] = args['cwd'] / "figures"
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import merge_hdi
+from draw_store import open_draw_store
 
 df = pd.read_csv(args['derived_dir'] / 'df_full.csv')
 
@@ -30,7 +31,7 @@ grouped_sum = df_pop.groupby(['gender'])['pop'].transform('sum')
 df_pop['pop_pct'] = df_pop['pop'] / grouped_sum
 
 # -------------------------- prop 0,1,2,4,9 --------------------------
-xr_data = xr.open_dataset(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
+xr_data = open_draw_store(args['output_dir'] / 'bnb_gp_awgtr_gen.zarr', vars=['prop'])
 data = merge_hdi(xr_data, 'prop')
 data = data.rename(columns={'prop_dim_0':'gender', 'prop_dim_1':'age', 'prop_dim_2':'wave', 'prop_dim_3':'y',})
 data['wave'] = data['wave'] + 1
@@ -22,11 +22,12 @@ args['fig_dir'] = args['cwd'] / "figures"
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import merge_hdi
+from draw_store import open_draw_store
 
 
 
 # -------------------------- variance components line plot --------------------------
-xr_data = xr.open_dataset(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
+xr_data = open_draw_store(args['output_dir'] / 'bnb_gp_awgtr_gen.zarr', vars=['vars'])
 data = merge_hdi(xr_data, 'vars')
 
 
@@ -22,12 +22,13 @@ args['fig_dir'] = args['cwd'] / "figures"
 import sys
 sys.path.append(os.path.join(args['cwd'], 'src', 'python'))
 from utils import merge_hdi
+from draw_store import open_draw_store
 
 
 
 # -------------------------- variance component coutour --------------------------
 
-xr_data = xr.open_dataset(args['output_dir'] / 'bnb_gp_awgtr_gen.nc')
+xr_data = open_draw_store(args['output_dir'] / 'bnb_gp_awgtr_gen.zarr', vars=['vars'])
 data_all = merge_hdi(xr_data, 'vars')
 
 data_all = data_all.rename(columns={'vars_dim_0':'age', 'vars_dim_1':'gender', 'vars_dim_2':'wave', 'vars_dim_3':'repeat', 'vars_dim_4':'type'})
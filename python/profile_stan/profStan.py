@@ -1,4 +1,5 @@
 import os
+import pandas as pd
 from pathlib import Path
 
 args = {}
@@ -37,10 +38,6 @@ BNB_cpp.sample(stan_data_0, **args['sample_args'])
 models['BNB_cpp'] = BNB_cpp
 BNB_cpp.az_data.posterior.mean(dim=["chain", "draw"])
 
-# rename the csv file to avoid overwriting
-profile_cpp = os.path.abspath(os.path.join(os.path.dirname(__file__), 'profile.csv'))
-os.rename(profile_cpp, 'profile_cpp.csv')
-
 args['BNB_stan'] = os.path.join(args['stan_dir'], 'BNB_stan.stan')
 BNB_stan = stan_model(args['BNB_stan'], )
 BNB_stan.compile(user_header=args['hpp'], stanc_options=args['stanc_args'])
@@ -48,5 +45,6 @@ BNB_stan.sample(stan_data_0, **args['sample_args'])
 models['BNB_stan'] = BNB_stan
 BNB_stan.az_data.posterior.mean(dim=["chain", "draw"])
 
-profile_stan = os.path.abspath(os.path.join(os.path.dirname(__file__), 'profile.csv'))
-os.rename(profile_stan, 'profile_stan.csv')
\ No newline at end of file
+# profile() blocks and sampler timing of both runs, collected by stan_model.sample
+performance = pd.concat([model.performance for model in models.values()])
+performance.pivot_table(index=['block', 'metric'], columns='model', values='value', aggfunc='sum')
\ No newline at end of file
@@ -5,5 +5,7 @@
 #include "bnb/beta_neg_binomial_lcdf.hpp"
 #include "bnb/beta_neg_binomial_lccdf.hpp"
 #include "bnb/beta_neg_binomial_rng.hpp"
+#include "bnb/bnb_var_components.hpp"
+#include "bnb/trunc_bnb_summary.hpp"
 
 #endif // BETA_NEG_BINOMIAL_HPP
\ No newline at end of file
@@ -0,0 +1,144 @@
+#ifndef BNB_VAR_COMPONENTS_HPP
+#define BNB_VAR_COMPONENTS_HPP
+
+#include <stan/math/prim/meta.hpp>
+#include <stan/math/prim/err.hpp>
+#include <stan/math/prim/fun/Eigen.hpp>
+#include <stan/math/prim/fun/value_of.hpp>
+#include <stan/math/prim/prob/neg_binomial_2_lpmf.hpp>
+#include <stan/math/prim/prob/neg_binomial_2_lcdf.hpp>
+#include <cmath>
+#include <map>
+#include <tuple>
+#include <utility>
+#include <stan/math.hpp>
+
+namespace bnb_gp_awgtr_model_namespace {
+
+/**
+ * Computes the Gauss-Jacobi rule for the Beta(k, rho) density on [0, 1] with the
+ * Golub-Welsch algorithm. The Jacobi weight (1-x)^(rho-1) (1+x)^(k-1) on [-1, 1]
+ * is mapped to [0, 1] with b = (1+x)/2 and the weights are normalized to sum to one.
+ *
+ * @param rho prior success parameter
+ * @param k prior failure parameter
+ * @param n_nodes number of quadrature nodes
+ * @param nodes output nodes in (0, 1)
+ * @param weights output weights
+ */
+inline void beta_gauss_jacobi_rule(double rho, double k, int n_nodes,
+                                   Eigen::VectorXd& nodes, Eigen::VectorXd& weights) {
+  const double alpha = rho - 1;
+  const double beta = k - 1;
+
+  // recurrence coefficients of the monic Jacobi polynomials
+  Eigen::VectorXd diag(n_nodes);
+  Eigen::VectorXd off_diag(std::max(n_nodes - 1, 0));
+  diag[0] = (beta - alpha) / (alpha + beta + 2);
+  for (int i = 1; i < n_nodes; i++) {
+    const double ab = 2 * i + alpha + beta;
+    diag[i] = (beta * beta - alpha * alpha) / (ab * (ab + 2));
+    if (i == 1) {
+      off_diag[0] = std::sqrt(4 * (1 + alpha) * (1 + beta)
+                              / ((ab * ab) * (ab + 1)));
+    } else {
+      off_diag[i - 1] = std::sqrt(4 * i * (i + alpha) * (i + beta) * (i + alpha + beta)
+                                  / ((ab * ab) * (ab + 1) * (ab - 1)));
+    }
+  }
+
+  Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> solver;
+  solver.computeFromTridiagonal(diag, off_diag, Eigen::ComputeEigenvectors);
+  nodes = (1 + solver.eigenvalues().array()) / 2;
+  weights = solver.eigenvectors().row(0).transpose().array().square();
+  weights /= weights.sum();
+}
+
+/**
+ * Returns the Gauss-Jacobi rule of `beta_gauss_jacobi_rule` as (nodes, weights). The
+ * rules are kept across calls, keyed on (rho, k, n_nodes), so that the eigensolve is
+ * only done once per distinct prior. The cache is emptied when it holds more than
+ * max_rules rules, as rho and k change with every draw.
+ */
+inline const std::pair<Eigen::VectorXd, Eigen::VectorXd>&
+cached_beta_gauss_jacobi_rule(double rho, double k, int n_nodes) {
+  static const size_t max_rules = 256;
+  static thread_local std::map<std::tuple<double, double, int>,
+                               std::pair<Eigen::VectorXd, Eigen::VectorXd>> rules;
+  const auto key = std::make_tuple(rho, k, n_nodes);
+  auto rule = rules.find(key);
+  if (rule == rules.end()) {
+    if (rules.size() >= max_rules) {
+      rules.clear();
+    }
+    Eigen::VectorXd nodes, weights;
+    beta_gauss_jacobi_rule(rho, k, n_nodes, nodes, weights);
+    rule = rules.emplace(key, std::make_pair(std::move(nodes), std::move(weights))).first;
+  }
+  return rule->second;
+}
+
+/**
+ * Computes the mean of a Negative Binomial distribution with mean mu and
+ * dispersion a, truncated at c.
+ */
+inline double trunc_nb_mean_dbl(double a, double mu, int c) {
+  const double log_ratio = stan::math::neg_binomial_2_lpmf(c + 1, mu, a)
+                           - stan::math::neg_binomial_2_lcdf(c, mu, a);
+  return mu - (a + mu) * (c + 1) * std::exp(log_ratio) / a;
+}
+
+/**
+ * Returns Var(E[Y | nu]) of the BNB distribution truncated at y_max, where Y | nu
+ * is Negative Binomial with mean nu and dispersion a, and nu / a follows a
+ * Beta-prime(k, rho) distribution. With nu = a * b / (1 - b) and b ~ Beta(k, rho),
+ * both moments of E[Y | nu] are fixed Gauss-Jacobi quadratures, whose rule is
+ * cached across calls with the same rho, k and n_nodes.
+ *
+ * Intended for generated quantities: the result carries no gradients.
+ *
+ * @param a number of successes parameter
+ * @param rho prior success parameter
+ * @param k prior failure parameter
+ * @param y_max truncation point
+ * @param n_nodes number of quadrature nodes
+ * @return variance of the truncated conditional mean
+ * @throw std::domain_error if a, rho, or k fails to be positive
+ */
+template <typename T_a, typename T_rho, typename T_k>
+inline stan::return_type_t<T_a, T_rho, T_k> bnb_var_nu_E_Y(const T_a& a,
+                                                           const T_rho& rho,
+                                                           const T_k& k,
+                                                           const int& y_max,
+                                                           const int& n_nodes,
+                                                           std::ostream* pstream__) {
+  using stan::math::value_of;
+  using stan::math::check_positive;
+  using stan::math::check_positive_finite;
+  static const char* function = "bnb_var_nu_E_Y";
+  const double a_dbl = value_of(a);
+  const double rho_dbl = value_of(rho);
+  const double k_dbl = value_of(k);
+  check_positive_finite(function, "Number of successes parameter", a_dbl);
+  check_positive_finite(function, "First prior sample size parameter", rho_dbl);
+  check_positive_finite(function, "Second prior sample size parameter", k_dbl);
+  check_positive(function, "Number of quadrature nodes", n_nodes);
+
+  const std::pair<Eigen::VectorXd, Eigen::VectorXd>& rule
+      = cached_beta_gauss_jacobi_rule(rho_dbl, k_dbl, n_nodes);
+  const Eigen::VectorXd& nodes = rule.first;
+  const Eigen::VectorXd& weights = rule.second;
+
+  double E_nu = 0;
+  double E_nu2 = 0;
+  for (int i = 0; i < n_nodes; i++) {
+    const double nu = a_dbl * nodes[i] / (1 - nodes[i]);
+    const double m = trunc_nb_mean_dbl(a_dbl, nu, y_max);
+    E_nu += weights[i] * m;
+    E_nu2 += weights[i] * m * m;
+  }
+  return E_nu2 - E_nu * E_nu;
+}
+
+}
+#endif
@@ -0,0 +1,113 @@
+#ifndef TRUNC_BNB_SUMMARY_HPP
+#define TRUNC_BNB_SUMMARY_HPP
+
+#include <stan/math/prim/meta.hpp>
+#include <stan/math/prim/err.hpp>
+#include <stan/math/prim/fun/Eigen.hpp>
+#include <stan/math/prim/fun/value_of.hpp>
+#include <stan/math/prim/fun/lgamma.hpp>
+#include <stan/math/prim/fun/log_sum_exp.hpp>
+#include <cmath>
+#include <limits>
+#include <vector>
+#include <stan/math.hpp>
+
+namespace bnb_gp_awgtr_model_namespace {
+
+/**
+ * Returns lgamma(y + 1) for y = 0, ..., y_max. The table is kept across calls and
+ * extended when a larger y_max is requested.
+ */
+inline const std::vector<double>& bnb_lgamma_y1(int y_max) {
+  static thread_local std::vector<double> table;
+  for (int y = table.size(); y <= y_max; y++) {
+    table.push_back(stan::math::lgamma(y + 1.0));
+  }
+  return table;
+}
+
+/**
+ * Returns lgamma(y + k) - lgamma(y + 1) for y = 0, ..., y_max. k is the same for all
+ * cells of a draw, so the terms of the last k are kept across calls.
+ */
+inline const std::vector<double>& bnb_k_terms(double k, int y_max) {
+  static thread_local double last_k = std::numeric_limits<double>::quiet_NaN();
+  static thread_local std::vector<double> terms;
+  if (k != last_k || static_cast<int>(terms.size()) <= y_max) {
+    const std::vector<double>& lgamma_y1 = bnb_lgamma_y1(y_max);
+    terms.resize(y_max + 1);
+    for (int y = 0; y <= y_max; y++) {
+      terms[y] = stan::math::lgamma(y + k) - lgamma_y1[y];
+    }
+    last_k = k;
+  }
+  return terms;
+}
+
+/**
+ * Computes the summaries of the BNB distribution truncated at y_max from a single
+ * normalized PMF on 0, 1, ..., y_max: its mean, its variance, the probability of
+ * zero and P(Y > t) for every threshold t. Terms of the log PMF that are constant
+ * in y cancel in the normalization, leaving
+ * lgamma(y + a) - lgamma(y + a + rho + k) + lgamma(y + k) - lgamma(y + 1),
+ * where the last two terms are cached across calls.
+ *
+ * Intended for generated quantities: the result carries no gradients.
+ *
+ * @param a number of successes parameter
+ * @param rho prior success parameter
+ * @param k prior failure parameter
+ * @param y_max truncation point
+ * @param thresholds values t at which the complementary CDF is evaluated
+ * @return vector of the mean, variance, P(Y = 0), then P(Y > t) for every threshold
+ * @throw std::domain_error if a, rho, or k fails to be positive, or if y_max
+ * or a threshold is negative
+ */
+template <typename T_a, typename T_rho, typename T_k>
+inline Eigen::Matrix<stan::return_type_t<T_a, T_rho, T_k>, -1, 1>
+trunc_bnb_summary(const T_a& a, const T_rho& rho, const T_k& k, const int& y_max,
+                  const std::vector<int>& thresholds, std::ostream* pstream__) {
+  using stan::math::value_of;
+  using stan::math::check_nonnegative;
+  using stan::math::check_positive_finite;
+  static const char* function = "trunc_bnb_summary";
+  const double a_dbl = value_of(a);
+  const double rho_dbl = value_of(rho);
+  const double k_dbl = value_of(k);
+  check_positive_finite(function, "Number of successes parameter", a_dbl);
+  check_positive_finite(function, "First prior sample size parameter", rho_dbl);
+  check_positive_finite(function, "Second prior sample size parameter", k_dbl);
+  check_nonnegative(function, "Truncation point", y_max);
+  check_nonnegative(function, "Thresholds", thresholds);
+
+  const std::vector<double>& k_terms = bnb_k_terms(k_dbl, y_max);
+  const double ark = a_dbl + rho_dbl + k_dbl;
+  Eigen::VectorXd lprobs(y_max + 1);
+  for (int y = 0; y <= y_max; y++) {
+    lprobs[y] = stan::math::lgamma(y + a_dbl) - stan::math::lgamma(y + ark) + k_terms[y];
+  }
+  const Eigen::VectorXd probs = (lprobs.array() - stan::math::log_sum_exp(lprobs)).exp().matrix();
+
+  // tail[y] = P(Y >= y), summed from the top so that small tail probabilities keep their precision
+  Eigen::VectorXd tail(y_max + 2);
+  tail[y_max + 1] = 0;
+  double EY = 0;
+  double EY2 = 0;
+  for (int y = y_max; y >= 0; y--) {
+    tail[y] = tail[y + 1] + probs[y];
+    EY += y * probs[y];
+    EY2 += static_cast<double>(y) * y * probs[y];
+  }
+
+  Eigen::Matrix<stan::return_type_t<T_a, T_rho, T_k>, -1, 1> summary(3 + thresholds.size());
+  summary[0] = EY;
+  summary[1] = EY2 - EY * EY;
+  summary[2] = probs[0];
+  for (size_t i = 0; i < thresholds.size(); i++) {
+    summary[3 + i] = tail[std::min(thresholds[i] + 1, y_max + 1)];
+  }
+  return summary;
+}
+
+}
+#endif
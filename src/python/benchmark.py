@@ -0,0 +1,108 @@
+"""
+Small timing harness used by `python/benchmark/bench.py`.
+
+A benchmark case is a name, a problem size and a callable. Each case is run a few times after
+an optional setup and the best wall time is kept. Results are stored as JSON so that a run can
+be compared against a saved baseline.
+"""
+import json
+import time
+import platform
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def time_call(func, repeat=3, setup=None, warmup=True):
+    """
+    Time a callable and keep the best of several runs.
+
+    Args:
+        func (callable): Function without arguments to time.
+        repeat (int, optional): Number of timed runs. Default is 3.
+        setup (callable, optional): Function called before every run, outside the timing.
+        warmup (bool, optional): Run `func` once untimed first, e.g. to trigger JIT compilation. Default is True.
+
+    Returns:
+        float: The fastest wall time in seconds.
+    """
+    if warmup:
+        if setup is not None:
+            setup()
+        func()
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_cases(cases, repeat=3, warmup=True):
+    """
+    Run benchmark cases and collect their timings.
+
+    Args:
+        cases (iterable): Tuples (name, size, func), optionally followed by `setup`, called before
+                          every run, and `metrics`, called after the timing and returning a dict of
+                          extra metrics (e.g. Stan profile times) stored with the timing.
+        repeat (int, optional): Number of timed runs per case. Default is 3.
+        warmup (bool, optional): Run every case once untimed first. Default is True.
+
+    Returns:
+        dict: Mapping from "name[size]" to a record with the name, size, best time and extra metrics.
+    """
+    results = {}
+    for case in cases:
+        name, size, func, setup, metrics = (tuple(case) + (None, None))[:5]
+        seconds = time_call(func, repeat=repeat, setup=setup, warmup=warmup)
+        extra = metrics() if metrics is not None else {}
+        results[f"{name}[{size}]"] = {"name": name, "size": int(size), "seconds": seconds, **extra}
+        print(f"{name:<28s} {size:>10d} {seconds:12.6f} s")
+    return results
+
+def save_results(results, path):
+    """
+    Save benchmark results together with information about the machine.
+    """
+    record = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(record, file, indent=2)
+
+def load_results(path):
+    """
+    Load the results saved by `save_results`.
+    """
+    with open(path, "r") as file:
+        return json.load(file)["results"]
+
+def compare_results(current, baseline, threshold=0.2):
+    """
+    Compare benchmark results against a baseline.
+
+    Args:
+        current, baseline (dict): Results as returned by `run_cases` or `load_results`.
+        threshold (float, optional): Relative slowdown above which a case counts as a regression. Default is 0.2.
+
+    Returns:
+        DataFrame: One row per case present in both results with the baseline and current times,
+                   their ratio and a 'regression' flag.
+    """
+    rows = []
+    for key in current.keys() & baseline.keys():
+        ratio = current[key]["seconds"] / baseline[key]["seconds"]
+        rows.append((current[key]["name"], current[key]["size"], baseline[key]["seconds"],
+                     current[key]["seconds"], ratio, ratio > 1 + threshold))
+    columns = ["name", "size", "baseline", "current", "ratio", "regression"]
+    return pd.DataFrame(rows, columns=columns).sort_values(["name", "size"]).reset_index(drop=True)
@@ -0,0 +1,238 @@
+"""
+JIT-compiled BNB kernels mirroring the C++ user header in `src/cpp/bnb/`.
+
+The functions take (n, r, alpha, beta) like `beta_neg_binomial_lpmf(n | r, alpha, beta)` in Stan:
+every argument is either a scalar or a one-dimensional container, and all non-scalar arguments
+must have the same size. As in Stan, the log densities return the sum over all elements unless
+`pointwise=True`, which returns one value per element instead.
+
+With the TBB threading layer, processes forked after a parallel kernel ran, e.g. by the process pools
+of `bootstrap`, hang on exit; set `numba.config.THREADING_LAYER = "workqueue"` before the first call
+when both are used in one process.
+"""
+import numpy as np
+from math import lgamma, log, exp, log1p, expm1, inf
+from numba import njit, prange
+
+
+# -------------------------- argument handling --------------------------
+
+def _consistent_arrays(function, names, args):
+    """
+    Broadcast scalars and equally sized 1-D containers to a common length, as `check_consistent_sizes` in Stan.
+    """
+    arrays = [np.atleast_1d(np.asarray(x, dtype=float)) for x in args]
+    for name, x in zip(names, arrays):
+        if x.ndim != 1:
+            raise Exception(f"{function}: {name} must be a scalar or a one-dimensional container.")
+    sizes = {x.size for x, arg in zip(arrays, args) if np.ndim(arg) > 0}
+    if len(sizes) > 1:
+        raise Exception(f"{function}: non-scalar arguments must have the same size, got sizes {sorted(sizes)}.")
+    size = sizes.pop() if sizes else 1
+    return [np.ascontiguousarray(np.broadcast_to(x, size)) for x in arrays]
+
+def _check_positive_finite(function, names, arrays):
+    for name, x in zip(names, arrays):
+        if not np.all(np.isfinite(x) & (x > 0)):
+            raise Exception(f"{function}: {name} must be positive finite.")
+
+def _prepare(function, n, r, alpha, beta):
+    names = ["Successes variable", "Number of successes parameter",
+             "First prior sample size parameter", "Second prior sample size parameter"]
+    n, r, alpha, beta = _consistent_arrays(function, names, (n, r, alpha, beta))
+    _check_positive_finite(function, names[1:], (r, alpha, beta))
+    return n.astype(np.int64), r, alpha, beta
+
+
+# -------------------------- kernels --------------------------
+
+# largest Poisson rate of neg_binomial_rng in Stan
+_POISSON_MAX_RATE = 2.0**30
+# log CDF above which the log CCDF is summed directly instead of taken as log(1 - CDF)
+_LCCDF_COMPLEMENT = log1p(-1e-3)
+_LCCDF_MAX_STEPS = 100000
+_LOG_EPSILON = log(np.finfo(np.float64).eps)
+
+@njit(cache=True)
+def _lbeta(a, b):
+    return lgamma(a) + lgamma(b) - lgamma(a + b)
+
+@njit(cache=True)
+def _log_sum_exp(x, y):
+    if x == -inf:
+        return y
+    if x > y:
+        return x + log1p(exp(y - x))
+    return y + log1p(exp(x - y))
+
+@njit(cache=True)
+def _lpmf_one(n, r, alpha, beta):
+    if n < 0:
+        return -inf
+    return (_lbeta(n + r, alpha + beta) - _lbeta(r, alpha)
+            + lgamma(n + beta) - lgamma(n + 1.0) - lgamma(beta))
+
+@njit(cache=True)
+def _lcdf_one(n, r, alpha, beta):
+    # accumulate the pmf from 0 to n with the ratio
+    # p(k+1) / p(k) = (k + r)(k + beta) / ((k + 1)(k + r + alpha + beta))
+    if n < 0:
+        return -inf
+    lp = _lbeta(r, alpha + beta) - _lbeta(r, alpha)
+    lcdf = lp
+    for k in range(n):
+        lp += log((k + r) * (k + beta) / ((k + 1.0) * (k + r + alpha + beta)))
+        lcdf = _log_sum_exp(lcdf, lp)
+    return min(lcdf, 0.0)
+
+@njit(cache=True)
+def _log1m_exp(x):
+    if x > -0.6931471805599453:
+        return log(-expm1(x))
+    return log1p(-exp(x))
+
+@njit(parallel=True, cache=True)
+def _lpmf_kernel(n, r, alpha, beta):
+    out = np.empty(n.size)
+    for i in prange(n.size):
+        out[i] = _lpmf_one(n[i], r[i], alpha[i], beta[i])
+    return out
+
+@njit(parallel=True, cache=True)
+def _lcdf_kernel(n, r, alpha, beta):
+    out = np.empty(n.size)
+    for i in prange(n.size):
+        out[i] = _lcdf_one(n[i], r[i], alpha[i], beta[i])
+    return out
+
+@njit(cache=True)
+def _lccdf_one(n, r, alpha, beta):
+    if n < 0:
+        return 0.0
+    lcdf = _lcdf_one(n, r, alpha, beta)
+    if lcdf < _LCCDF_COMPLEMENT:
+        # the tail holds more than 1e-3 of the mass, so 1 - CDF keeps its precision
+        return _log1m_exp(lcdf)
+    # sum the upper tail directly from n + 1, as the 3F2 series of the C++ header does,
+    # until the terms decrease and no longer change the sum
+    lp = _lpmf_one(n + 1, r, alpha, beta)
+    ltail = lp
+    for k in range(n + 1, n + 1 + _LCCDF_MAX_STEPS):
+        ratio = (k + r) * (k + beta) / ((k + 1.0) * (k + r + alpha + beta))
+        lp += log(ratio)
+        ltail = _log_sum_exp(ltail, lp)
+        if ratio < 1 and lp < ltail + _LOG_EPSILON:
+            return ltail
+    # heavy tails converge too slowly; their complement still has a relative error of about eps * n / 1e-3
+    return _log1m_exp(lcdf)
+
+@njit(parallel=True, cache=True)
+def _lccdf_kernel(n, r, alpha, beta):
+    out = np.empty(n.size)
+    for i in prange(n.size):
+        out[i] = _lccdf_one(n[i], r[i], alpha[i], beta[i])
+    return out
+
+@njit(cache=True)
+def _rng_one(r, alpha, beta):
+    # p ~ Beta(alpha, beta), y ~ NB(r, p) as a gamma-Poisson mixture with rate p / (1 - p)
+    p = np.random.beta(alpha, beta)
+    rate = np.random.gamma(r, (1 - p) / p) if p > 0 else inf
+    # as neg_binomial_rng in Stan, e.g. when p underflows to zero for a small alpha; exceptions do not
+    # leave parallel loops on every threading layer, so -1 marks the draw and the caller raises
+    if not rate < _POISSON_MAX_RATE:
+        return -1
+    return np.random.poisson(rate)
+
+@njit(parallel=True, cache=True)
+def _rng_kernel(r, alpha, beta):
+    out = np.empty(r.size, dtype=np.int64)
+    for i in prange(r.size):
+        out[i] = _rng_one(r[i], alpha[i], beta[i])
+    return out
+
+@njit(cache=True)
+def _rng_kernel_seeded(r, alpha, beta, seed):
+    np.random.seed(seed)
+    out = np.empty(r.size, dtype=np.int64)
+    for i in range(r.size):
+        out[i] = _rng_one(r[i], alpha[i], beta[i])
+    return out
+
+
+# -------------------------- public functions --------------------------
+
+def beta_neg_binomial_lpmf(n, r, alpha, beta, pointwise=False):
+    """
+    Compute the log PMF of the BNB distribution.
+
+    Args:
+        n (int or array-like): Number of failures.
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution.
+        pointwise (bool, optional): Return one value per element instead of the sum. Default is False.
+
+    Returns:
+        float or ndarray: Sum of the log probabilities, or the log probabilities if `pointwise` is True.
+    """
+    out = _lpmf_kernel(*_prepare("beta_neg_binomial_lpmf", n, r, alpha, beta))
+    return out if pointwise else out.sum()
+
+def beta_neg_binomial_lcdf(n, r, alpha, beta, pointwise=False):
+    """
+    Compute the log CDF of the BNB distribution.
+
+    Args:
+        n (int or array-like): Number of failures.
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution.
+        pointwise (bool, optional): Return one value per element instead of the sum. Default is False.
+
+    Returns:
+        float or ndarray: Sum of the log CDFs, or the log CDFs if `pointwise` is True.
+    """
+    out = _lcdf_kernel(*_prepare("beta_neg_binomial_lcdf", n, r, alpha, beta))
+    return out if pointwise else out.sum()
+
+def beta_neg_binomial_lccdf(n, r, alpha, beta, pointwise=False):
+    """
+    Compute the log complementary CDF, log P(Y > n), of the BNB distribution.
+
+    Args:
+        n (int or array-like): Number of failures.
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution.
+        pointwise (bool, optional): Return one value per element instead of the sum. Default is False.
+
+    Returns:
+        float or ndarray: Sum of the log CCDFs, or the log CCDFs if `pointwise` is True.
+    """
+    out = _lccdf_kernel(*_prepare("beta_neg_binomial_lccdf", n, r, alpha, beta))
+    return out if pointwise else out.sum()
+
+def beta_neg_binomial_rng(r, alpha, beta, seed=None):
+    """
+    Generate random samples from a BNB distribution.
+
+    Without a seed the draws are generated in parallel. With a seed they are generated on a single
+    thread, because numba keeps a separate random state per thread. As in Stan, an exception is raised
+    when the Poisson rate of a draw reaches 2^30, e.g. because p underflows to zero for a small alpha.
+
+    Args:
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution.
+        seed (int, optional): Seed value for the random number generator.
+
+    Returns:
+        int or ndarray: A random sample if all arguments are scalars, otherwise an array with one sample per element.
+    """
+    names = ["Number of successes parameter", "First prior sample size parameter", "Second prior sample size parameter"]
+    arrays = _consistent_arrays("beta_neg_binomial_rng", names, (r, alpha, beta))
+    _check_positive_finite("beta_neg_binomial_rng", names, arrays)
+    if seed is None:
+        out = _rng_kernel(*arrays)
+    else:
+        out = _rng_kernel_seeded(*arrays, seed)
+    if np.any(out < 0):
+        raise Exception("beta_neg_binomial_rng: Random number that came from gamma distribution is too large, "
+                        "alpha is too small for a finite sample.")
+    if all(np.ndim(x) == 0 for x in (r, alpha, beta)):
+        return int(out[0])
+    return out
+
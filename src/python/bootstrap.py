@@ -0,0 +1,148 @@
+"""
+Parallel bootstrap of the count distribution fits in `utils`.
+
+Every group is compressed to a unique-value histogram once. Nonparametric replicates resample
+the histogram with a multinomial draw and give percentile intervals of the parameters. Parametric
+replicates simulate from the fitted distribution and give bootstrap p-values of the KS and
+Cramér–von Mises statistics on the discrete CDF. Each (group, family) task runs in a process
+pool with its own random substream, so the results do not depend on the number of workers.
+"""
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import (count_histogram, poi_mle_fit, nb_mle_fit, bnb_mle_fit, zipf_mle_fit, bnb_canonical_params,
+                   beta_neg_binomial_cdf, zipf_cdf, beta_negative_binomial_rng)
+
+
+# -------------------------- distribution families --------------------------
+# Each family defines how to fit a histogram, evaluate the CDF on 0, 1, ..., y_max and
+# simulate data. Zipf is fitted to y+1, as the counts start at zero. Families whose likelihood
+# has symmetric parameters also define how to map a fit onto one branch, see `bnb_canonical_params`.
+
+FAMILIES = {
+    'poisson': {
+        'params': ['mu'],
+        'fit': lambda values, counts: (poi_mle_fit(values, counts),),
+        'cdf': lambda y, mu: stats.poisson.cdf(y, mu),
+        'rng': lambda rng, size, mu: rng.poisson(mu, size),
+    },
+    'nbinom': {
+        'params': ['r', 'p'],
+        'fit': lambda values, counts: nb_mle_fit(values, counts),
+        'cdf': lambda y, r, p: stats.nbinom.cdf(y, r, p),
+        'rng': lambda rng, size, r, p: rng.negative_binomial(r, p, size),
+    },
+    'bnb': {
+        'params': ['r', 'alpha', 'beta'],
+        'fit': lambda values, counts: bnb_mle_fit(values, counts),
+        'cdf': lambda y, r, alpha, beta: beta_neg_binomial_cdf(y, r, alpha, beta),
+        'rng': lambda rng, size, r, alpha, beta: beta_negative_binomial_rng(r, alpha, beta, size=size, seed=rng),
+        'canonical': bnb_canonical_params,
+    },
+    'zipf': {
+        'params': ['s'],
+        'fit': lambda values, counts: (zipf_mle_fit(values + 1, counts),),
+        'cdf': lambda y, s: zipf_cdf(y + 1, s, None),
+        'rng': lambda rng, size, s: rng.zipf(s, size) - 1,
+    },
+}
+
+
+def discrete_gof_statistics(values, counts, cdf, y_max=None):
+    """
+    Compute the KS and Cramér–von Mises statistics of a histogram against a discrete CDF.
+
+    Args:
+        values, counts (ndarray): Unique observed values and their counts.
+        cdf (callable): Function returning the model CDF at an array of values.
+        y_max (int, optional): Largest support point to compare. Default is max(values).
+
+    Returns:
+        tuple: KS statistic max|F_n - F| and Cramér–von Mises statistic n * sum (F_n - F)^2 p,
+               both taken over the support 0, 1, ..., y_max.
+    """
+    n = np.sum(counts)
+    y_max = int(np.max(values)) if y_max is None else int(y_max)
+    y = np.arange(y_max + 1)
+    inside = values <= y_max
+    ecdf = np.cumsum(np.bincount(values[inside].astype(np.intp), weights=counts[inside], minlength=y.size)) / n
+    model_cdf = cdf(y)
+    pmf = np.diff(model_cdf, prepend=0)
+    return np.max(np.abs(ecdf - model_cdf)), n * np.sum((ecdf - model_cdf)**2 * pmf)
+
+def _bootstrap_task(values, counts, family, n_boot, seed):
+    """
+    Run the nonparametric and parametric bootstrap of one family on one histogram.
+    """
+    spec = FAMILIES[family]
+    rng = np.random.default_rng(seed)
+    n = int(np.sum(counts))
+    # heavy-tailed simulations can reach huge values, so all statistics share the observed support
+    y_max = int(np.max(values))
+
+    # the point estimate and every replicate on the same branch, so the intervals are of one parameter
+    canonical = spec.get('canonical', lambda *params: params)
+
+    def fit(values, counts):
+        return canonical(*spec['fit'](values, counts))
+
+    estimate = fit(values, counts)
+    stat_obs = discrete_gof_statistics(values, counts, lambda y: spec['cdf'](y, *estimate), y_max)
+
+    boot_params = np.empty((n_boot, len(spec['params'])))
+    boot_stats = np.empty((n_boot, 2))
+    for b in range(n_boot):
+        # nonparametric: resample the histogram
+        resampled = rng.multinomial(n, counts / n)
+        keep = resampled > 0
+        boot_params[b] = fit(values[keep], resampled[keep])
+        # parametric: simulate from the fitted model, refit and recompute the statistics
+        sim_values, sim_counts = count_histogram(spec['rng'](rng, n, *estimate))
+        sim_estimate = fit(sim_values, sim_counts)
+        boot_stats[b] = discrete_gof_statistics(sim_values, sim_counts, lambda y: spec['cdf'](y, *sim_estimate), y_max)
+    return np.asarray(estimate), boot_params, np.asarray(stat_obs), boot_stats
+
+def bootstrap_fits(df, value, by, families=('poisson', 'nbinom', 'bnb', 'zipf'),
+                   n_boot=1000, ci=0.90, seed=None, max_workers=None):
+    """
+    Bootstrap the MLE fits of several count distributions for every group of a dataframe.
+
+    Args:
+        df (DataFrame): Data containing the observations and the grouping columns.
+        value (str): Name of the column with the observed counts, e.g. 'nhh_nct'.
+        by (str or list): Grouping column(s), e.g. 'wave_grp'.
+        families (iterable, optional): Keys of `FAMILIES` to fit. Default fits all of them.
+        n_boot (int, optional): Number of bootstrap replicates. Default is 1000.
+        ci (float, optional): Probability mass of the percentile intervals. Default is 0.90.
+        seed (int, optional): Root seed; every (group, family) task gets its own substream.
+        max_workers (int, optional): Number of worker processes. Default uses all cores.
+
+    Returns:
+        tuple: A tuple containing:
+               - DataFrame of parameter estimates with columns 'estimate', 'lower' and 'upper'.
+               - DataFrame of GOF statistics 'ks' and 'cvm' with their bootstrap p-values.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    groups = [(keys if isinstance(keys, tuple) else (keys,), count_histogram(group[value].to_numpy()))
+              for keys, group in df.groupby(by, sort=True)]
+    tasks = [(keys, histogram, family) for keys, histogram in groups for family in families]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_bootstrap_task, *histogram, family, n_boot, task_seed)
+                   for (keys, histogram, family), task_seed in zip(tasks, seeds)]
+        results = [future.result() for future in futures]
+
+    param_rows, gof_rows = [], []
+    for (keys, _, family), (estimate, boot_params, stat_obs, boot_stats) in zip(tasks, results):
+        lower, upper = np.quantile(boot_params, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+        for i, param in enumerate(FAMILIES[family]['params']):
+            param_rows.append((*keys, family, param, estimate[i], lower[i], upper[i]))
+        pvalues = (1 + np.sum(boot_stats >= stat_obs, axis=0)) / (1 + n_boot)
+        gof_rows.append((*keys, family, stat_obs[0], pvalues[0], stat_obs[1], pvalues[1]))
+
+    params = pd.DataFrame(param_rows, columns=by + ['family', 'param', 'estimate', 'lower', 'upper'])
+    gof = pd.DataFrame(gof_rows, columns=by + ['family', 'ks', 'ks_pvalue', 'cvm', 'cvm_pvalue'])
+    return params, gof
@@ -0,0 +1,81 @@
+"""
+Chunked zarr store of the draws of a fit or of its generated quantities.
+
+The store is written one chain at a time from the cmdstan CSV files, so that only one chain is held
+in memory, and every chain is appended along the chain dimension. Each variable is chunked along the
+draws and along its own dimensions, with chunks of at most about `chunk_mb` megabytes. `open_draw_store`
+opens the variables lazily as dask arrays: selecting a variable and a slice of it only reads the chunks
+that hold that slice. Dimensions are named as in `CmdStanMCMC.draws_xr`, e.g. 'prop_dim_0'.
+"""
+import os
+import numpy as np
+import xarray as xr
+
+from stan_csv import read_stan_csv, split_variables
+
+
+def _variable_chunks(shape, draw_chunk, itemsize, chunk_bytes):
+    """
+    Chunk shape (chain, draw, ...) of a variable, halving its largest dimension until a chunk fits in `chunk_bytes`.
+    """
+    chunks = [1, draw_chunk] + list(shape)
+    while np.prod(chunks) * itemsize > chunk_bytes and max(chunks[2:], default=1) > 1:
+        i = 2 + int(np.argmax(chunks[2:]))
+        chunks[i] = (chunks[i] + 1) // 2
+    return tuple(chunks)
+
+def _chain_dataset(draws, column_names, chain_id):
+    """
+    Dataset of one chain, with the dimensions and coordinates of `CmdStanMCMC.draws_xr`.
+    """
+    data_vars = {}
+    for name, values in split_variables(draws, column_names).items():
+        data_vars[name] = (["chain", "draw"] + [f"{name}_dim_{i}" for i in range(values.ndim - 2)], values)
+    return xr.Dataset(data_vars, coords={"chain": [chain_id], "draw": np.arange(draws.shape[1])})
+
+def write_draw_store(store, csv_files, vars=None, exclude=None, inc_warmup=False, draw_chunk=100, chunk_mb=8):
+    """
+    Write the draws in a set of cmdstan CSV files to a zarr store, one chain at a time.
+
+    Args:
+        store (str or Path): Path of the zarr store, e.g. 'bnb_gp_awgtr_gen.zarr'. It is overwritten.
+        csv_files (list): One CSV file per chain, from sampling or from generate_quantities, or per chain a list
+                          of CSV files holding consecutive draws of that chain, e.g. the shards of `sharded_gq`.
+        vars (list, optional): Variables to write. Default writes all of them.
+        exclude (list, optional): Variables to skip, e.g. ['log_lik', 'y_hat'].
+        inc_warmup (bool, optional): Also write the saved warmup draws. Default is False.
+        draw_chunk (int, optional): Number of draws per chunk. Default is 100.
+        chunk_mb (float, optional): Maximum size of a chunk in megabytes. Default is 8.
+
+    Returns:
+        Dataset: The store, opened lazily with `open_draw_store`.
+    """
+    for chain, files in enumerate(csv_files):
+        files = [files] if isinstance(files, (str, os.PathLike)) else list(files)
+        parts = [read_stan_csv([file], vars=vars, exclude=exclude, inc_warmup=inc_warmup, max_workers=1)
+                 for file in files]
+        draws = np.concatenate([part[0] for part in parts], axis=1)
+        column_names = parts[0][1]
+        dataset = _chain_dataset(draws, column_names, chain + 1)
+        if chain == 0:
+            encoding = {name: {"chunks": _variable_chunks(variable.shape[2:], min(draw_chunk, draws.shape[1]),
+                                                          variable.dtype.itemsize, chunk_mb * 2**20)}
+                        for name, variable in dataset.data_vars.items()}
+            dataset.to_zarr(store, mode="w", encoding=encoding)
+        else:
+            dataset.to_zarr(store, append_dim="chain")
+    return open_draw_store(store)
+
+def open_draw_store(store, vars=None):
+    """
+    Open a draw store lazily, optionally restricted to some variables.
+
+    Args:
+        store (str or Path): Path of the zarr store.
+        vars (list, optional): Variables to open. Default opens all of them.
+
+    Returns:
+        Dataset: Dask-backed dataset; values are only read when computed, e.g. with `.values` or `.load()`.
+    """
+    dataset = xr.open_zarr(store)
+    return dataset if vars is None else dataset[list(vars)]
@@ -0,0 +1,135 @@
+"""
+Binary cache of the draws in a set of cmdstan CSV files.
+
+The draws are stored as one `.npy` file per variable, holding the CSV columns of that variable
+with shape (chain, draw, column). A JSON manifest records the column layout and the paths, sizes
+and modification times of the CSV files, so the cache is rebuilt as soon as one of them changes.
+Reading a variable memory-maps its file and does not touch the others.
+"""
+import os
+import json
+import numpy as np
+
+
+def stan_column_groups(column_names):
+    """
+    Group the columns of a cmdstan CSV file by variable.
+
+    Args:
+        column_names (iterable): Column names as in the CSV header, e.g. 'lp__', 'mu', 'beta[1,2]'.
+
+    Returns:
+        dict: Mapping from variable name to a tuple (start, end, dims), where the variable occupies
+              the columns start:end and has shape `dims`. Stan writes containers in column-major
+              order, so the columns are reshaped with order='F'.
+    """
+    groups = {}
+    for i, column in enumerate(column_names):
+        name, _, index = column.partition('[')
+        dims = tuple(int(x) for x in index.rstrip(']').split(',')) if index else ()
+        start = groups[name][0] if name in groups else i
+        groups[name] = (start, i + 1, dims)
+    return groups
+
+def _csv_key(csv_files):
+    return [[os.path.abspath(file), os.path.getsize(file), os.stat(file).st_mtime_ns]
+            for file in sorted(map(str, csv_files))]
+
+
+class draws_cache:
+    """
+    Memory-mapped cache of the draws of a cmdstanpy fit, keyed on the CSV files it was read from.
+    """
+    def __init__(self, cache_dir, csv_files):
+        self.cache_dir = cache_dir
+        self.csv_files = csv_files
+        self.manifest = None
+        manifest_file = os.path.join(cache_dir, "manifest.json")
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r") as file:
+                manifest = json.load(file)
+            if manifest["key"] == _csv_key(csv_files):
+                self.manifest = manifest
+
+    @property
+    def valid(self):
+        """
+        True if the cache matches the current CSV files.
+        """
+        return self.manifest is not None
+
+    def write(self, draws, column_names, num_draws_warmup=0):
+        """
+        Writes the draws of all chains, e.g. as returned by `stan_csv.read_stan_csv`.
+
+        Args:
+            draws (ndarray): Draws of shape (chain, draw, column), starting with the saved warmup draws.
+            column_names (list): Column names in the bracket notation of cmdstanpy.
+            num_draws_warmup (int, optional): Number of warmup draws in `draws`. Default is 0.
+        """
+        self.write_chains(((chain, num_draws_warmup) for chain in draws), column_names, len(draws))
+
+    def write_chains(self, chains, column_names, n_chains):
+        """
+        Writes the draws one chain at a time into preallocated memory-mapped files, so that only one
+        chain is held in memory, e.g. as returned by `stan_csv.iter_stan_csv`.
+
+        Args:
+            chains (iterable): (draws, num_draws_warmup) of every chain, where the draws have shape
+                               (draw, column) and start with the saved warmup draws.
+            column_names (list): Column names in the bracket notation of cmdstanpy.
+            n_chains (int): Number of chains.
+        """
+        groups = stan_column_groups(column_names)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = {}
+        for chain, (draws, n_warmup) in enumerate(chains):
+            if chain == 0:
+                num_draws_warmup, n_draws = n_warmup, len(draws)
+                for name, (start, end, _) in groups.items():
+                    files[name] = np.lib.format.open_memmap(os.path.join(self.cache_dir, name + ".npy"), mode="w+",
+                                                            dtype=draws.dtype, shape=(n_chains, n_draws, end - start))
+            elif n_warmup != num_draws_warmup or len(draws) != n_draws:
+                raise Exception("The chains have different numbers of draws.")
+            for name, (start, end, _) in groups.items():
+                files[name][chain] = draws[:, start:end]
+        for file in files.values():
+            file.flush()
+        del files
+        manifest = {
+            "key": _csv_key(self.csv_files),
+            "column_names": list(column_names),
+            "variables": {name: [start, end, list(dims)] for name, (start, end, dims) in groups.items()},
+            "chains": int(n_chains),
+            "num_draws_warmup": int(num_draws_warmup),
+        }
+        # the manifest is written last, so an interrupted write leaves an invalid cache
+        with open(os.path.join(self.cache_dir, "manifest.json"), "w") as file:
+            json.dump(manifest, file)
+        self.manifest = manifest
+
+    @property
+    def column_names(self):
+        return self.manifest["column_names"]
+
+    @property
+    def num_draws_warmup(self):
+        return self.manifest["num_draws_warmup"]
+
+    def columns(self, name):
+        """
+        Returns the memory-mapped CSV columns of a variable with shape (chain, draw, column).
+        """
+        if name not in self.manifest["variables"]:
+            raise Exception(f"Variable {name} is not in the draws cache.")
+        return np.load(os.path.join(self.cache_dir, name + ".npy"), mmap_mode="r")
+
+    def variable(self, name, inc_warmup=False):
+        """
+        Returns the draws of a variable with shape (chain, draw, ...), without the warmup draws unless `inc_warmup` is True.
+        """
+        dims = tuple(self.manifest["variables"][name][2])
+        columns = self.columns(name)
+        if not inc_warmup:
+            columns = columns[:, self.num_draws_warmup:]
+        return np.asarray(columns).reshape(columns.shape[:2] + dims, order="F")
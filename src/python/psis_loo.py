@@ -0,0 +1,106 @@
+"""
+PSIS-LOO for pointwise log likelihoods that do not fit in memory.
+
+The log likelihood is read in chunks of observations from a `.npy` file, either the one of the draws
+cache or one written from the cmdstan CSV files, which are parsed once, one chain at a time. Every chunk
+is Pareto smoothed by `az.loo` in a worker process. The pointwise results are then combined into the
+same `ELPDData` as a single `az.loo` call, since the LOO estimate, its standard error and p_loo are all
+sums over the observations.
+"""
+import os
+import copy
+import tempfile
+import numpy as np
+import xarray as xr
+import arviz as az
+from concurrent.futures import ProcessPoolExecutor
+
+from stan_csv import _read_chain
+
+
+def _write_log_lik(csv_files, columns, path):
+    """
+    Parse the given columns of every chain once, without the warmup draws, into a float32 `.npy` file
+    of shape (chain, draw, column), one chain at a time. The CSV files hold 6 significant digits, so
+    float32 loses nothing.
+
+    Returns:
+        ndarray: Column of every observation within the `.npy` file.
+    """
+    usecols, columns = np.unique(columns, return_inverse=True)
+    log_lik = None
+    for chain, file in enumerate(csv_files):
+        draws, n_warmup = _read_chain(file, usecols)
+        if log_lik is None:
+            log_lik = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                                shape=(len(csv_files), len(draws) - n_warmup, len(usecols)))
+        elif len(draws) - n_warmup != log_lik.shape[1]:
+            raise Exception("The chains have different numbers of draws.")
+        log_lik[chain] = draws[n_warmup:]
+        del draws
+    log_lik.flush()
+    return columns.reshape(-1)
+
+def _read_log_lik(path, columns, n_warmup):
+    """
+    Read the given columns of the log likelihood without the warmup draws, with shape (chain, draw, column).
+    """
+    # .npy file of shape (chain, draw, column)
+    return np.load(path, mmap_mode="r")[:, n_warmup:][..., columns]
+
+def _loo_chunk(source, columns, n_warmup, reff, dtype, scale):
+    log_lik = np.asarray(_read_log_lik(source, columns, n_warmup), dtype=dtype)
+    data = az.from_dict(log_likelihood={"log_lik": log_lik})
+    return az.loo(data, pointwise=True, reff=reff, scale=scale)
+
+def chunked_loo(source, columns, n_warmup=0, reff=1.0, chunk_size=2000, dtype=np.float64,
+                scale="log", dim="log_lik_dim_0", coords=None, max_workers=None):
+    """
+    Compute PSIS-LOO in chunks of observations.
+
+    Args:
+        source (str or list): Path to the `.npy` file of `log_lik` in the draws cache, or the cmdstan CSV files.
+        columns (array-like): Column of every observation, within the `.npy` file or the CSV files.
+                              A column can be repeated, e.g. to expand the log likelihood of cells to observations.
+        n_warmup (int, optional): Number of warmup draws stored in the `.npy` file. The CSV files are read without them,
+                                  once, into a temporary float32 `.npy` file.
+        reff (float, optional): Relative MCMC efficiency, as in `az.loo`. Default is 1.0.
+        chunk_size (int, optional): Number of observations per chunk. Default is 2000.
+        dtype (dtype, optional): Data type of the chunks, np.float32 halves the memory. Default is np.float64.
+        scale (str, optional): Scale of the estimate, as in `az.loo`. Default is "log".
+        dim (str, optional): Name of the observation dimension of the pointwise results.
+        coords (array-like, optional): Coordinates of the observations. Default is 0, 1, ..., N-1.
+        max_workers (int, optional): Number of worker processes, each holding one chunk. Default is 2, or 1 on a single core.
+
+    Returns:
+        ELPDData: The pointwise LOO estimate, as returned by `az.loo(..., pointwise=True)`.
+    """
+    columns = np.asarray(columns)
+    n_data_points = len(columns)
+    max_workers = max_workers or min(2, os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory(prefix="log_lik_") as tmp_dir:
+        if not isinstance(source, (str, os.PathLike)):
+            path = os.path.join(tmp_dir, "log_lik.npy")
+            columns, source, n_warmup = _write_log_lik(source, columns, path), path, 0
+        chunks = [columns[start:start + chunk_size] for start in range(0, n_data_points, chunk_size)]
+        task_args = [(source, chunk, n_warmup, reff, dtype, scale) for chunk in chunks]
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_loo_chunk, *zip(*task_args)))
+        else:
+            results = [_loo_chunk(*args) for args in task_args]
+
+    coords = np.arange(n_data_points) if coords is None else np.asarray(coords)
+    loo_i = np.concatenate([result["loo_i"].values for result in results])
+    pareto_k = np.concatenate([result["pareto_k"].values for result in results])
+
+    # reuse the layout of the ELPDData of the installed ArviZ version
+    elpd = copy.deepcopy(results[0])
+    elpd["elpd_loo"] = loo_i.sum()
+    elpd["se"] = (n_data_points * np.var(loo_i)) ** 0.5
+    elpd["p_loo"] = sum(result["p_loo"] for result in results)
+    elpd["n_data_points"] = n_data_points
+    elpd["warning"] = any(result["warning"] for result in results)
+    elpd["loo_i"] = xr.DataArray(loo_i, dims=[dim], coords={dim: coords}, name="loo_i")
+    elpd["pareto_k"] = xr.DataArray(pareto_k, dims=[dim], coords={dim: coords}, name="pareto_shape")
+    return elpd
@@ -0,0 +1,93 @@
+"""
+Compile and sample several `stan_model` objects concurrently.
+
+All models are compiled first, in parallel. Each model is built in its own folder with its own copy
+of the user header (see `stan_build`), so models sharing the BNB header never touch each other's
+namespace. Sampling jobs are then started as soon as enough cores are free, where a job needs
+chains x threads_per_chain cores, and the InferenceData of every model is built as soon as its job
+finishes.
+"""
+import os
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def _compile_job(name, job):
+    start = time.perf_counter()
+    job["model"].compile(**job.get("compile", {}))
+    return time.perf_counter() - start
+
+def _sample_job(name, job, sample_args, save):
+    start = time.perf_counter()
+    model = job["model"]
+    model.sample(job["data"], **sample_args)
+    sample_time = time.perf_counter() - start
+    if save:
+        model.save()
+    # convert the draws here, so az.compare does not wait for all of them at the end
+    az_data = model.az_data
+    return az_data, sample_time, time.perf_counter() - start
+
+def run_models(jobs, sample_args=None, cores=None, compile_workers=None, save=True):
+    """
+    Compile all models concurrently, then sample them within a budget of cores.
+
+    Args:
+        jobs (dict): Mapping from model name to a dict with the `stan_model` under 'model', its data under
+                     'data' and optionally the keyword arguments of `stan_model.compile` under 'compile'.
+        sample_args (dict, optional): Keyword arguments of `stan_model.sample` shared by all models.
+                                      'sample' can also be given per model, to override them.
+        cores (int, optional): Number of cores to share between the sampling jobs. Default uses all cores.
+        compile_workers (int, optional): Number of concurrent compilations. Default compiles all models at once.
+        save (bool, optional): Save the CSV files of every model after sampling. Default is True.
+
+    Returns:
+        tuple: A tuple containing:
+               - dict mapping the model names to their InferenceData, ready for `az.compare`.
+               - DataFrame with the compile, sampling and total wall time of every model in seconds.
+    """
+    cores = cores or os.cpu_count() or 1
+    sample_args = dict(sample_args or {})
+    times = {name: {} for name in jobs}
+
+    names = list(jobs)
+    with ThreadPoolExecutor(max_workers=compile_workers or len(names)) as executor:
+        # the first build of a CmdStan installation also builds its shared objects,
+        # so one model is compiled on its own before the others
+        times[names[0]]["compile"] = _compile_job(names[0], jobs[names[0]])
+        futures = {executor.submit(_compile_job, name, jobs[name]): name for name in names[1:]}
+        for future in futures:
+            times[futures[future]]["compile"] = future.result()
+
+    job_args = {name: dict(sample_args, **jobs[name].get("sample", {})) for name in names}
+    for name in names:
+        job_args[name].setdefault("parallel_chains", job_args[name].get("chains", 4))
+    need = {name: min(cores, job_args[name].get("chains", 4) * job_args[name].get("threads_per_chain", 1))
+            for name in names}
+
+    az_data = {}
+    pending = sorted(names, key=lambda name: -need[name])
+    running = {}
+    free = cores
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        while pending or running:
+            # start every pending job that fits in the free cores, largest first
+            for name in list(pending):
+                if need[name] <= free:
+                    free -= need[name]
+                    pending.remove(name)
+                    running[executor.submit(_sample_job, name, jobs[name], job_args[name], save)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                free += need[name]
+                az_data[name], times[name]["sample"], times[name]["total"] = future.result()
+                times[name]["total"] += times[name]["compile"]
+                print(f"{name} finished: compile {times[name]['compile']:.1f} s, "
+                      f"sampling {times[name]['sample']:.1f} s")
+
+    timing = pd.DataFrame.from_dict(times, orient="index")
+    timing.index.name = "model"
+    timing["cores"] = pd.Series(need)
+    return {name: az_data[name] for name in names}, timing
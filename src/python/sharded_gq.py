@@ -0,0 +1,151 @@
+"""
+Standalone generated quantities, run concurrently on shards of the fitted draws.
+
+The draws of every chain are split into shards of consecutive draws. Each shard is written as a
+fixed_param sampler CSV file holding only the parameters and is passed to its own generate_quantities
+process. A shard that finished writes a `done.json` marker, keyed on the fitted CSV files, the build of
+the model, a hash of the data, its range of draws and its seed, so that running again only repeats the
+shards that failed or are missing, and all shards once the model or the data changed. The
+outputs are then merged chain by chain, in the order of the draws, into a draw store (see `draw_store`).
+"""
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from draws_cache import _csv_key
+from draw_store import write_draw_store
+from stan_csv import read_stan_csv, write_stan_csv
+
+
+def _shard_ranges(n_draws, shards_per_chain):
+    bounds = np.linspace(0, n_draws, shards_per_chain + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def _header_config(path):
+    """
+    The 'key = value' pairs of the comments above the header of a cmdstan CSV file.
+    """
+    config = {}
+    with open(path, "r") as file:
+        for line in file:
+            if not line.startswith("#"):
+                break
+            key, sep, value = line.lstrip("# ").partition("=")
+            if sep:
+                config[key.strip()] = value.replace("(Default)", "").strip()
+    return config
+
+def _model_key(gen_model):
+    """
+    Hash of the build of the model, see `stan_build`, or the size and modification time of its executable
+    if it was not built by `stan_model.compile`.
+    """
+    build = getattr(gen_model, "build", None)
+    if build is not None:
+        return build["hash"]
+    exe_file = gen_model.model.exe_file
+    return [os.path.abspath(exe_file), os.path.getsize(exe_file), os.stat(exe_file).st_mtime_ns]
+
+def _data_key(stan_data):
+    """
+    Hash of the data as JSON, converting arrays, Series and NumPy scalars to lists and numbers.
+    """
+    data = json.dumps(stan_data, sort_keys=True, default=lambda x: np.asarray(x).tolist())
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def _shard_done(shard_dir, key):
+    """
+    Returns the output CSV file of a finished shard, or None if it has to be run.
+    """
+    marker = os.path.join(shard_dir, "done.json")
+    if not os.path.exists(marker):
+        return None
+    with open(marker, "r") as file:
+        done = json.load(file)
+    if done["key"] != key or not os.path.exists(done["csv_file"]):
+        return None
+    return done["csv_file"]
+
+def _run_shard(model, stan_data, shard_dir, shard_csv, key, seed):
+    result = model.generate_quantities(data=stan_data, previous_fit=[shard_csv], gq_output_dir=shard_dir,
+                                       seed=seed, show_console=False)
+    csv_file = result.runset.csv_files[0]
+    # the marker is written last, so an interrupted shard is run again
+    with open(os.path.join(shard_dir, "done.json"), "w") as file:
+        json.dump({"key": key, "csv_file": csv_file}, file)
+    return csv_file
+
+def run_sharded_gq(gen_model, stan_data, csv_files, output_dir, store, shards_per_chain=4, max_workers=None,
+                   seed=None, vars=None):
+    """
+    Run the generated quantities of a compiled model on shards of the fitted draws and merge the outputs.
+
+    Args:
+        gen_model (stan_model): Compiled model with the same parameters as the fit and the generated quantities.
+        stan_data (dict): The data.
+        csv_files (list): Sampler CSV files of the fit, one per chain.
+        output_dir (str or Path): Folder of the shard inputs and outputs, one subfolder per shard.
+        store (str or Path): Zarr store the generated quantities are merged into.
+        shards_per_chain (int, optional): Number of shards every chain is split into. Default is 4.
+        max_workers (int, optional): Number of concurrent generate_quantities processes. Default uses all cores.
+        seed (int, optional): Seed of the first shard, shard k uses seed + k. Default lets cmdstan choose.
+        vars (list, optional): Generated quantities to merge. Default merges all of them.
+
+    Returns:
+        Dataset: The merged store, opened lazily with `open_draw_store`.
+    """
+    model = gen_model.model
+    parameters = list(model.src_info()["parameters"])
+    vars = list(model.src_info()["generated quantities"]) if vars is None else list(vars)
+    fit_key = _csv_key(csv_files)
+    model_key = _model_key(gen_model)
+    data_key = _data_key(stan_data)
+    config = _header_config(csv_files[0])
+    n_draws = -(-int(config["num_samples"]) // int(config.get("thin", 1)))
+    stan_version = tuple(int(config[f"stan_version_{part}"]) for part in ("major", "minor", "patch"))
+    ranges = _shard_ranges(n_draws, shards_per_chain)
+
+    shards = []
+    for chain in range(len(csv_files)):
+        for start, end in ranges:
+            k = len(shards)
+            shard_dir = os.path.join(output_dir, f"shard_{k + 1}")
+            key = {"fit": fit_key, "model": model_key, "data": data_key, "chain": chain, "draws": [start, end],
+                   "seed": None if seed is None else seed + k}
+            shards.append({"chain": chain, "dir": shard_dir, "key": key, "csv_file": _shard_done(shard_dir, key)})
+    pending = [shard for shard in shards if shard["csv_file"] is None]
+    print(f"{len(shards) - len(pending)} of {len(shards)} shards already done.")
+
+    # write the parameters of the pending shards, reading every chain once
+    for chain, file in enumerate(csv_files):
+        chain_shards = [shard for shard in pending if shard["chain"] == chain]
+        if not chain_shards:
+            continue
+        draws, column_names, _ = read_stan_csv([file], vars=["lp__"] + parameters, max_workers=1)
+        for shard in chain_shards:
+            shutil.rmtree(shard["dir"], ignore_errors=True)
+            os.makedirs(shard["dir"])
+            start, end = shard["key"]["draws"]
+            shard["input"] = os.path.join(shard["dir"], "fitted_params.csv")
+            write_stan_csv(shard["input"], draws[0, start:end], column_names, gen_model.stan_name,
+                           stan_version=stan_version, chain_id=chain + 1)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+        futures = {executor.submit(_run_shard, model, stan_data, shard["dir"], shard["input"], shard["key"],
+                                   shard["key"]["seed"]): shard for shard in pending}
+        for future, shard in futures.items():
+            try:
+                shard["csv_file"] = future.result()
+            except Exception as e:
+                failed.append(os.path.basename(shard["dir"]))
+                print(f"{os.path.basename(shard['dir'])} failed: {e}")
+    if failed:
+        raise Exception(f"Shards {', '.join(failed)} failed, run again to resume them.")
+
+    chain_files = [[shard["csv_file"] for shard in shards if shard["chain"] == chain]
+                   for chain in range(len(csv_files))]
+    return write_draw_store(store, chain_files, vars=vars)
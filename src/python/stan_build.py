@@ -0,0 +1,131 @@
+"""
+Out-of-tree build cache for Stan models with a C++ user header.
+
+Stan requires the functions of a user header to live in the namespace `<model name>_model_namespace`.
+Instead of rewriting the shared headers in `src/cpp` for every model, each build gets its own folder
+with a copy of the Stan file and of the header files, with the namespace of that model. The folder is
+named after a hash of everything that goes into the executable: the Stan file and its `#include`
+closure, the header files and the stanc/C++ options. A model is only built again if one of them changes.
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+
+def stan_include_closure(stan_file, include_paths):
+    """
+    Find the files included by a Stan program, recursively.
+
+    Args:
+        stan_file (str or Path): Stan program.
+        include_paths (list): Folders in which stanc looks for included files.
+
+    Returns:
+        list: Paths of the included files, in the order they are first included.
+    """
+    found = []
+    pending = [Path(stan_file)]
+    while pending:
+        with open(pending.pop(0), "r") as file:
+            program = file.read()
+        for name in re.findall(r'^\s*#include\s+["<]?([^">\s]+)[">]?', program, flags=re.M):
+            for path in include_paths:
+                candidate = (Path(path) / name).resolve()
+                if candidate.exists():
+                    if candidate not in found:
+                        found.append(candidate)
+                        pending.append(candidate)
+                    break
+            else:
+                raise Exception(f"Cannot find the included file {name} of {stan_file}.")
+    return found
+
+def header_include_closure(user_header):
+    """
+    Find a C++ header and the headers it includes with `#include "..."`, recursively.
+    """
+    found = [Path(user_header).resolve()]
+    for header in found:
+        with open(header, "r") as file:
+            for name in re.findall(r'^\s*#include\s+"([^"]+)"', file.read(), flags=re.M):
+                candidate = (header.parent / name).resolve()
+                if candidate.exists() and candidate not in found:
+                    found.append(candidate)
+    return found
+
+def build_hash(files, *options):
+    """
+    Hash the contents of a list of files together with JSON-serializable options.
+    """
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, "rb") as f:
+            digest.update(f.read())
+    for option in options:
+        digest.update(json.dumps(option, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def rewrite_namespace(source, target, stan_name):
+    """
+    Copy a header file, renaming the `<model name>_model_namespace` it declares to the one of `stan_name`.
+    """
+    with open(source, "r") as file:
+        lines = file.readlines()
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first, so that concurrent builds never see a partial header
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        for line in lines:
+            if re.match(r'^namespace (\S+)_model_namespace {', line):
+                file.write(f'namespace {stan_name}_model_namespace {{\n')
+            else:
+                file.write(line)
+    os.replace(tmp, target)
+
+def prepare_build(stan_file, build_dir, user_header=None, stanc_options=None, cpp_options=None):
+    """
+    Set up the build folder of a Stan model.
+
+    Args:
+        stan_file (str or Path): Stan program.
+        build_dir (str or Path): Root of the build cache.
+        user_header (str or Path, optional): C++ header with the functions declared in the Stan program.
+        stanc_options (dict, optional): Options passed to stanc, e.g. {"include-paths": [...]}.
+        cpp_options (dict, optional): Options passed to the C++ compiler.
+
+    Returns:
+        dict: The copied Stan file 'stan_file', the copied header 'user_header', the expected executable
+              'exe_file', the 'stanc_options' to build it with and the 'hash' of the build.
+    """
+    stan_file = Path(stan_file).resolve()
+    stan_name = stan_file.stem
+    stanc_options = dict(stanc_options or {})
+    # the copied Stan file resolves its includes from the original folder
+    include_paths = [str(stan_file.parent)] + [str(path) for path in stanc_options.get("include-paths", [])]
+    stanc_options["include-paths"] = include_paths
+
+    sources = [stan_file] + stan_include_closure(stan_file, include_paths)
+    headers = [] if user_header is None else header_include_closure(user_header)
+    key = build_hash(sources + headers, stan_name, stanc_options, cpp_options or {})
+    model_dir = Path(build_dir) / f"{stan_name}-{key[:16]}"
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    target = model_dir / stan_file.name
+    if not target.exists():
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(stan_file, tmp)
+        os.replace(tmp, target)
+    header = None
+    if user_header is not None:
+        root = Path(user_header).resolve().parent
+        for file in headers:
+            copy = model_dir / "cpp" / file.relative_to(root)
+            if not copy.exists():
+                rewrite_namespace(file, copy, stan_name)
+        header = model_dir / "cpp" / Path(user_header).name
+    exe_file = model_dir / (stan_name + (".exe" if os.name == "nt" else ""))
+    return {"stan_file": target, "user_header": header, "exe_file": exe_file,
+            "stanc_options": stanc_options, "hash": key}
@@ -0,0 +1,228 @@
+"""
+Columnar parser for the CSV files written by the cmdstan sampler.
+
+Each chain is parsed in its own worker with the C tokenizer of `np.loadtxt`, converting only
+the columns of the requested variables. Rows written before the '# Adaptation terminated'
+comment are the saved warmup draws. Column names use the bracket notation of cmdstanpy,
+e.g. 'beta[1,2]' for the CSV column 'beta.1.2'.
+"""
+import os
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from draws_cache import stan_column_groups
+
+
+def _bracket_name(column):
+    name, *index = column.split('.')
+    return f"{name}[{','.join(index)}]" if index else name
+
+def read_stan_csv_header(path):
+    """
+    Read the column names of a cmdstan CSV file without reading the draws.
+    """
+    with open(path, "r") as file:
+        for line in file:
+            if not line.startswith("#"):
+                return [_bracket_name(column) for column in line.strip().split(",")]
+    raise Exception(f"Cannot find the header of {path}.")
+
+def _read_chain(path, usecols):
+    """
+    Parse the selected columns of one chain and count its warmup rows, streaming over the lines.
+    """
+    n_rows = n_warmup = 0
+
+    def draw_lines(file):
+        nonlocal n_rows, n_warmup
+        for line in file:
+            if line.startswith(b"#"):
+                if line.startswith(b"# Adaptation terminated"):
+                    n_warmup = n_rows
+            else:
+                n_rows += 1
+                yield line
+
+    with open(path, "rb") as file:
+        # the header is the first line that is not a comment
+        for line in file:
+            if not line.startswith(b"#"):
+                break
+        draws = np.loadtxt(draw_lines(file), delimiter=",", usecols=usecols, ndmin=2, dtype=np.float64)
+    return draws, n_warmup
+
+def _select_columns(column_names, vars, exclude):
+    """
+    Indices of the columns of the selected variables.
+    """
+    groups = stan_column_groups(column_names)
+    names = list(groups) if vars is None else list(vars)
+    names = [name for name in dict.fromkeys(names) if name not in (exclude or [])]
+    for name in names:
+        if name not in groups:
+            raise Exception(f"Unknown variable: {name}")
+    return [i for name in names for i in range(groups[name][0], groups[name][1])]
+
+def iter_stan_csv(csv_files, vars=None, exclude=None):
+    """
+    Read the draws of several chains from cmdstan CSV files one chain at a time, so that only one
+    chain is held in memory.
+
+    Args:
+        csv_files (list): One CSV file per chain.
+        vars (list, optional): Variables to read. Default reads all of them.
+        exclude (list, optional): Variables to skip.
+
+    Returns:
+        tuple: A tuple containing:
+               - list of the selected column names.
+               - generator of (draws, num_draws_warmup) per chain, where the draws have shape (draw, column)
+                 and start with the saved warmup draws.
+    """
+    column_names = read_stan_csv_header(csv_files[0])
+    usecols = _select_columns(column_names, vars, exclude)
+    return [column_names[i] for i in usecols], (_read_chain(file, usecols) for file in csv_files)
+
+def read_stan_csv(csv_files, vars=None, exclude=None, inc_warmup=False, max_workers=None):
+    """
+    Read the draws of several chains from cmdstan CSV files.
+
+    Args:
+        csv_files (list): One CSV file per chain.
+        vars (list, optional): Variables to read, e.g. ['lp__', 'beta']. Default reads all of them.
+        exclude (list, optional): Variables to skip, e.g. ['log_lik'].
+        inc_warmup (bool, optional): Keep the saved warmup draws. Default is False.
+        max_workers (int, optional): Number of worker processes. Default is one per chain, up to the number of cores.
+
+    Returns:
+        tuple: A tuple containing:
+               - ndarray of shape (chain, draw, column) with the selected columns.
+               - list of the selected column names.
+               - int, the number of warmup draws in the array.
+    """
+    column_names = read_stan_csv_header(csv_files[0])
+    usecols = _select_columns(column_names, vars, exclude)
+
+    if max_workers is None:
+        max_workers = min(len(csv_files), os.cpu_count() or 1)
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chains = list(executor.map(_read_chain, csv_files, [usecols] * len(csv_files)))
+    else:
+        chains = [_read_chain(file, usecols) for file in csv_files]
+
+    n_warmup = {n for _, n in chains}
+    if len(n_warmup) > 1:
+        raise Exception("The chains have different numbers of warmup draws.")
+    n_warmup = n_warmup.pop()
+    skip = 0 if inc_warmup else n_warmup
+    draws = np.stack([chain[skip:] for chain, _ in chains])
+    return draws, [column_names[i] for i in usecols], n_warmup - skip
+
+def _dot_name(column):
+    name, _, index = column.partition('[')
+    return ".".join([name] + index.rstrip(']').split(',')) if index else name
+
+def write_stan_csv(path, draws, column_names, model_name, stan_version=(2, 33, 0), seed=None, chain_id=1,
+                   elapsed=0.0):
+    """
+    Write draws from another algorithm as the CSV file of one chain of the fixed_param sampler,
+    so that they can be read with `from_csv(..., method='sample')` like the draws of NUTS.
+
+    Args:
+        path (str or Path): CSV file to write.
+        draws (ndarray): Draws of shape (draw, column), starting with the 'lp__' column.
+        column_names (list): Column names in the bracket notation of cmdstanpy, without 'accept_stat__'.
+        model_name (str): Name of the Stan model.
+        stan_version (tuple, optional): Major, minor and patch version of Stan.
+        seed (int, optional): Seed of the run, for the record.
+        chain_id (int, optional): Id of the chain. Default is 1.
+        elapsed (float, optional): Run time of the algorithm in seconds, written as the sampling time.
+    """
+    draws = np.asarray(draws, dtype=np.float64)
+    if column_names[0] != "lp__":
+        raise Exception("The first column of the draws must be lp__.")
+    major, minor, patch = stan_version
+    header = [
+        f"model = {model_name}_model",
+        "method = sample (Default)",
+        "  sample",
+        f"    num_samples = {len(draws)}",
+        # as written by cmdstan for fixed_param, which ignores the warmup; from_csv rejects num_warmup = 0
+        "    num_warmup = 1000 (Default)",
+        "    save_warmup = 0 (Default)",
+        "    thin = 1 (Default)",
+        "    algorithm = fixed_param",
+        "    num_chains = 1 (Default)",
+        f"id = {chain_id}",
+        "random",
+        f"  seed = {-1 if seed is None else seed}",
+        f"stan_version_major = {major}",
+        f"stan_version_minor = {minor}",
+        f"stan_version_patch = {patch}",
+    ]
+    # fixed_param writes lp__ = 0 and accept_stat__ = 0, here lp__ keeps the log density of every draw
+    names = ["lp__", "accept_stat__"] + [_dot_name(column) for column in column_names[1:]]
+    body = np.insert(draws, 1, 0.0, axis=1)
+    with open(path, "w") as file:
+        file.write("".join(f"# {line}\n" for line in header))
+        file.write(",".join(names) + "\n")
+        np.savetxt(file, body, delimiter=",", fmt="%.6g")
+        file.write("# \n")
+        file.write(f"#  Elapsed Time: 0 seconds (Warm-up)\n")
+        file.write(f"#                {elapsed:g} seconds (Sampling)\n")
+        file.write(f"#                {elapsed:g} seconds (Total)\n")
+        file.write("# \n")
+
+def read_sampler_stats(path):
+    """
+    Read the sampler columns of one chain, e.g. 'treedepth__' and 'divergent__', streaming over the lines
+    and splitting off only the leading columns, so that the draws of the model are never parsed.
+
+    Args:
+        path (str or Path): CSV file of one chain.
+
+    Returns:
+        tuple: A tuple containing:
+               - dict mapping every leading column ending in '__' to its values, starting with the saved warmup draws.
+               - int, the number of warmup draws.
+    """
+    names = None
+    rows = []
+    n_warmup = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if line.startswith(b"#"):
+                if names is not None and line.startswith(b"# Adaptation terminated"):
+                    n_warmup = len(rows)
+            elif names is None:
+                # lp__, accept_stat__, stepsize__, treedepth__, n_leapfrog__, divergent__, energy__ for NUTS
+                header = line.strip().split(b",")
+                names = [column.decode() for column in header[:next((i for i, column in enumerate(header)
+                                                                     if not column.endswith(b"__")), len(header))]]
+            else:
+                rows.append(line.split(b",", len(names))[:len(names)])
+    if names is None:
+        raise Exception(f"Cannot find the header of {path}.")
+    stats = np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+    return {name: stats[:, i] for i, name in enumerate(names)}, n_warmup
+
+def read_stan_csv_timing(path):
+    """
+    Read the elapsed warmup, sampling and total time in seconds from the footer of a cmdstan CSV file.
+    """
+    timing = {}
+    with open(path, "r") as file:
+        for line in file:
+            match = re.match(r'^#\s+(?:Elapsed Time:\s+)?([\d.eE+-]+) seconds \((\S+)\)', line)
+            if match:
+                timing[match.group(2).lower().replace("-", "")] = float(match.group(1))
+    return timing
+
+def split_variables(draws, column_names):
+    """
+    Split an array of shape (chain, draw, column) into variables of shape (chain, draw, ...).
+    """
+    return {name: draws[:, :, start:end].reshape(draws.shape[:2] + dims, order="F")
+            for name, (start, end, dims) in stan_column_groups(column_names).items()}
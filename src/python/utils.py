@@ -1,53 +1,105 @@
 import os
 import re
+import time
+import tempfile
+from datetime import datetime
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import arviz as az
+import xarray as xr
 from xarray import Dataset
-from cmdstanpy import CmdStanModel, from_csv
-from cmdstanpy.stanfit import CmdStanGQ, CmdStanMCMC
+from cmdstanpy import CmdStanModel, from_csv, cmdstan_path, write_stan_json
+from cmdstanpy.stanfit import CmdStanGQ, CmdStanMCMC, CmdStanVB
+from draws_cache import draws_cache, stan_column_groups
+from stan_csv import iter_stan_csv, read_sampler_stats, read_stan_csv, read_stan_csv_header, read_stan_csv_timing, split_variables, write_stan_csv
+from stan_build import prepare_build, rewrite_namespace
+from psis_loo import chunked_loo
+from draw_store import write_draw_store
 from IPython.display import display
 from pathlib import Path
 
 import scipy.stats as stats
-from scipy.optimize import minimize
-from scipy.special import betaln, gammaln, zeta
+from scipy.optimize import minimize, minimize_scalar
+from scipy.special import betaln, gammaln, digamma, polygamma, expit, zeta, roots_jacobi, logsumexp
 
 
 # -------------------------- cmdstanpy related functions --------------------------
-def merge_hdi(fit, name):
+def _median_hdi(samples, hdi_probs):
+    """
+    Median and highest density intervals along the last two axes (chain, draw) of an array.
+
+    The draws of every cell are sorted once, which gives the median and, for every probability,
+    the narrowest interval between sorted draws that holds that share of the draws, as in `az.hdi`.
+    Returns an array with the cells as leading axes and the statistics median, lower_1, higher_1,
+    lower_2, higher_2, ... along the last axis.
+    """
+    samples = np.sort(samples.reshape(samples.shape[:-2] + (-1,)), axis=-1)
+    n = samples.shape[-1]
+    summary = [0.5 * (samples[..., (n - 1) // 2] + samples[..., n // 2])]
+    for prob in hdi_probs:
+        width = int(np.floor(prob * n))
+        start = np.argmin(samples[..., width:] - samples[..., :n - width], axis=-1)[..., None]
+        summary.append(np.take_along_axis(samples, start, axis=-1)[..., 0])
+        summary.append(np.take_along_axis(samples, start + width, axis=-1)[..., 0])
+    return np.stack(summary, axis=-1)
+
+def merge_hdi(fit, name, hdi_prob=0.90):
     """
     Given a fit object, merge the median and hdi into a single dataframe.
 
+    Dask-backed variables, e.g. from `open_draw_store`, are summarized chunk by chunk of their cells,
+    each chunk holding all draws of its cells.
+
     Args:
-        fit (Union[Dataset, CmdStanGQ]): The fit object containing the MCMC samples.
-        name (str): The name of the variable within the fit object to analyze.
+        fit (Union[Dataset, CmdStanGQ, CmdStanMCMC, stan_model]): The fit object containing the MCMC samples.
+        name (str or list): The name of the variable within the fit object to analyze, or a list of names.
+        hdi_prob (float or list, optional): Probability of the HDI, or a list of probabilities. Default is 0.90.
 
     Returns:
-        DataFrame: A dataframe containing the median and 90% HDI for the specified variable.
+        DataFrame: A dataframe containing the median and HDI for the specified variable, with the columns
+                   'lower' and 'higher' for a single probability, or 'lower_90', 'higher_90', ... for
+                   several. A dict of such dataframes by variable if `name` is a list.
     """
+    names = [name] if isinstance(name, str) else list(name)
+    hdi_probs = np.atleast_1d(hdi_prob)
     if isinstance(fit, Dataset):
-        az_data = fit[name]
-    elif isinstance(fit, CmdStanGQ) or isinstance(fit, CmdStanMCMC):
-        az_data = fit.draws_xr(name)
-    dims = len(az_data.dims) - 2
-    index = [name+'_dim_'+str(i) for i in range(dims)]
-    data_hdi = az.hdi(az_data, hdi_prob=0.90).to_dataframe().reset_index()
-    data_hdi = data_hdi.pivot(index=index, columns='hdi', values=name)
-    data_hdi = data_hdi.reset_index()
-
-    data = az_data.to_dataframe().reset_index().drop(columns=['chain', 'draw'])
-    data = data.groupby(index).median().reset_index().rename(columns={name:'median'})
+        draws = fit[names]
+    elif isinstance(fit, CmdStanGQ) or isinstance(fit, CmdStanMCMC) or isinstance(fit, stan_model):
+        draws = fit.draws_xr(names)
+    if len(hdi_probs) == 1:
+        stat_names = ['median', 'lower', 'higher']
+    else:
+        stat_names = ['median'] + [f'{bound}_{100 * prob:g}' for prob in hdi_probs for bound in ('lower', 'higher')]
 
-    data = pd.merge(data, data_hdi, how='left', on=index)
-    return data
+    result = {}
+    for var in names:
+        az_data = draws[var]
+        if az_data.chunks is not None:
+            # all draws of a cell in one chunk, the cells chunked as stored
+            az_data = az_data.chunk({'chain': -1, 'draw': -1})
+        summary = xr.apply_ufunc(_median_hdi, az_data, kwargs={'hdi_probs': hdi_probs},
+                                 input_core_dims=[['chain', 'draw']], output_core_dims=[['stat']],
+                                 dask='parallelized', output_dtypes=[np.float64],
+                                 dask_gufunc_kwargs={'output_sizes': {'stat': len(stat_names)}})
+        summary = summary.assign_coords(stat=stat_names).compute()
+        index = [dim for dim in az_data.dims if dim not in ('chain', 'draw')]
+        if index:
+            data = summary.to_dataset(dim='stat').to_dataframe().reset_index()
+        else:
+            data = pd.DataFrame([summary.values], columns=stat_names)
+        columns = ['median'] + [stat_names[i] for k in range(len(hdi_probs)) for i in (2 + 2 * k, 1 + 2 * k)]
+        result[var] = data[index + columns]
+    return result[name] if isinstance(name, str) else result
 
-def make_fitting_data(data_file):
+def make_fitting_data(data_file, compress=False):
     """
     Process a data file and prepare it for Stan model fitting, specifically for BNB models.
 
     Args:
         data_file (str): Path to the CSV data file to be processed.
+        compress (bool, optional): Also add the unique (gender, age, time, rep, y) cells with their counts,
+                                   as used by the weighted likelihood of `bnb_gp_awgtr_cell.stan`. Default is False.
 
     Returns:
         dict: A dictionary containing data processed and formatted for Stan model fitting.
@@ -79,8 +131,21 @@ def make_fitting_data(data_file):
         "wave2time": np.repeat([1,2,3,4,5], [2,10,8,5,8]),
         "T_std": standardize_1d_array(np.linspace(1, 33, 33)),
         "A_std": standardize_1d_array(np.linspace(1, 86, 86)),
+        "grainsize": 1,
     }
 
+    if compress:
+        # the likelihood depends on an observation only through its cell (gender, age, time, rep, y)
+        keys = ["gender", "age", "time", "rep", "y"]
+        obs = pd.DataFrame({key: np.asarray(stan_data_0[key]) for key in keys})
+        cells, cell, n_cell = np.unique(obs.to_numpy(), axis=0, return_inverse=True, return_counts=True)
+        stan_data_0["C"] = len(cells)
+        for i, key in enumerate(keys):
+            stan_data_0[key + "_cell"] = cells[:, i]
+        stan_data_0["n_cell"] = n_cell
+        # cell of every observation, to expand the pointwise log_lik of the cells for LOO
+        stan_data_0["cell"] = cell.ravel() + 1
+
     return stan_data_0
 
 
@@ -88,13 +153,28 @@ class stan_model:
     """
     A wrapper for cmdstanpy that makes creating, executing and analyzing models easier.
     """
-    def __init__(self, stan_file, recover=False, stan_data=None, stan_save_dir=None):
+    def __init__(self, stan_file, recover=False, stan_data=None, stan_save_dir=None, var_names=None, inc_warmup=False,
+                 use_cache=True):
         """
         Initializes the stan_model with the necessary parameters and configurations.
+
+        The draws dataframe `df`, the ArviZ object `az_data` and `loo` are built on first access,
+        restricted to `var_names` if given. Warmup draws are only included if `inc_warmup` is True.
+        When recovering with `use_cache`, the parsed draws are kept in a binary cache next to the CSV files,
+        written on first access to the draws.
         """
         self.stan_file = stan_file
         self.stan_dir = os.path.dirname(stan_file)
         self.stan_name = os.path.basename(stan_file).split(".")[0]
+        self.var_names = var_names
+        self.inc_warmup = inc_warmup
+        self.use_cache = use_cache
+        self._cache = None
+        self.csv_files = None
+        self.performance = None
+        self.approximation = None
+        self._fit = None
+        self._reset_draws()
         self.recover = recover
         if self.recover:
             if stan_data is None:
@@ -121,17 +201,186 @@ class stan_model:
         print('Recover fitting from csv files:')
         for file in self.csv_files:
             print(file)
-        self.fit = from_csv(self.csv_files, method='sample')
-        self.df = self.fit.draws_pd()
-        display(self.df)
-        self.fit_to_inference_data()
-        display(self.az_data)
+        self._fit = None
+        self._cache = None
+        if self.use_cache:
+            # the cache is keyed on the paths, sizes and modification times of the CSV files
+            self._cache = draws_cache(os.path.join(self.stan_save_dir, ".draws_cache"), self.csv_files)
+        self._reset_draws()
+
+    @property
+    def cache(self):
+        """
+        The draws cache of the recovered CSV files, or None. The CSV files are only parsed into the cache
+        on first access, so recovering e.g. only for `csv_files` never reads the draws.
+        """
+        if self._cache is not None and not self._cache.valid:
+            # written chain by chain, so only one chain is held in memory
+            column_names, chains = iter_stan_csv(self.csv_files)
+            self._cache.write_chains(chains, column_names, len(self.csv_files))
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
+
+    @property
+    def fit(self):
+        """
+        The cmdstanpy fit object. When recovering, the CSV files are only parsed on first access.
+        """
+        if self._fit is None and self.csv_files is not None:
+            self._fit = from_csv(self.csv_files, method='sample')
+        return self._fit
+
+    @fit.setter
+    def fit(self, fit):
+        self._fit = fit
+
+    def _reset_draws(self):
+        """
+        Drops the cached conversions of the draws, e.g. after a new fit.
+        """
+        self._df = None
+        self._az_data = None
+        self._loo = None
+
+    @property
+    def df(self):
+        """
+        The draws as a pandas DataFrame, converted on first access.
+        """
+        if self._df is None:
+            if self.cache is None:
+                self._df = self.fit.draws_pd(vars=self.var_names, inc_warmup=self.inc_warmup)
+            else:
+                self._df = self._cached_draws_pd()
+        return self._df
+
+    def _cached_draws_pd(self):
+        """
+        Builds the draws DataFrame from the cache, with the same columns as `CmdStanMCMC.draws_pd`.
+        """
+        groups = stan_column_groups(self.cache.column_names)
+        names = list(groups) if self.var_names is None else list(self.var_names)
+        n_warmup = 0 if self.inc_warmup else self.cache.num_draws_warmup
+        blocks = [self.cache.columns(name)[:, n_warmup:] for name in names]
+        n_chains, n_draws = blocks[0].shape[:2]
+        columns = [column for name in names for column in self.cache.column_names[groups[name][0]:groups[name][1]]]
+        df = pd.DataFrame(np.concatenate(blocks, axis=2).reshape(n_chains * n_draws, -1), columns=columns)
+        if self.var_names is None:
+            df.insert(0, "chain__", np.repeat(np.arange(1, n_chains + 1), n_draws))
+            df.insert(1, "iter__", np.tile(np.arange(1, n_draws + 1), n_chains))
+            df.insert(2, "draw__", np.arange(1, n_chains * n_draws + 1))
+        return df
+
+    @property
+    def az_data(self):
+        """
+        The draws as an ArviZ InferenceData object, converted on first access.
+        """
+        if self._az_data is None:
+            self.fit_to_inference_data()
+        return self._az_data
+
+    @property
+    def loo(self):
+        """
+        The PSIS-LOO estimate, computed on first access with `compute_loo`. None if the model has no log_lik.
+        """
+        if self._loo is None:
+            self._loo = self.compute_loo()
+        return self._loo
+
+    def compute_loo(self, chunk_size=2000, dtype=np.float64, max_workers=None):
+        """
+        Computes PSIS-LOO in chunks of observations, read from the draws cache or from a copy of log_lik
+        parsed once from the CSV files, so that the whole log_lik is never held in memory. Returns the same
+        ELPDData as `az.loo(..., pointwise=True)`.
+
+        Args:
+            chunk_size (int, optional): Number of observations per chunk. Default is 2000.
+            dtype (dtype, optional): Data type of the chunks, np.float32 halves the memory. Default is np.float64.
+            max_workers (int, optional): Number of worker processes, each holding one chunk. Default is 2.
+        """
+        groups = stan_column_groups(self._column_names())
+        if "log_lik" not in groups:
+            return None
+        start, end, _ = groups["log_lik"]
+        columns = np.arange(end - start)
+        if self._is_cell_log_lik(end - start):
+            columns = columns[np.asarray(self.stan_data["cell"]) - 1]
+        if self.cache is not None:
+            source = os.path.join(self.cache.cache_dir, "log_lik.npy")
+            n_warmup = self.cache.num_draws_warmup
+        else:
+            source = self.csv_files if self._fit is None else self.fit.runset.csv_files
+            columns = columns + start
+            n_warmup = 0
+        return chunked_loo(source, columns, n_warmup, reff=self._relative_efficiency(), chunk_size=chunk_size,
+                           dtype=dtype, scale="log", dim="participant", coords=np.arange(1, len(columns) + 1),
+                           max_workers=max_workers)
+
+    def _relative_efficiency(self):
+        """
+        Relative efficiency of the posterior draws as in `az.loo`, the mean ESS of all parameters over the number of draws.
+        """
+        groups = stan_column_groups(self._column_names())
+        names = [name for name in groups if not name.endswith("__") and name not in ("log_lik", "y_hat")]
+        posterior = self._variable_draws(names)
+        n_chains, n_draws = next(iter(posterior.values())).shape[:2]
+        if n_chains == 1:
+            return 1.0
+        ess = az.ess(az.from_dict(posterior=posterior), method="mean")
+        return np.hstack([ess[name].values.ravel() for name in ess.data_vars]).mean() / (n_chains * n_draws)
+
+    def _variable_draws(self, names, inc_warmup=False):
+        """
+        Returns the sampling draws of the given variables as a dict of arrays with shape (chain, draw, ...),
+        read from the draws cache, the CSV files or the fit object.
+        """
+        if self.cache is not None:
+            return {name: self.cache.variable(name, inc_warmup=inc_warmup) for name in names}
+        if self._fit is None:
+            return split_variables(*read_stan_csv(self.csv_files, vars=names, inc_warmup=inc_warmup)[:2])
+        return {name: self.fit.draws_xr(vars=[name], inc_warmup=inc_warmup)[name].values for name in names}
+
+    def stan_variable(self, name, inc_warmup=False):
+        """
+        Returns the draws of a variable with shape (draw, ...) and the chains one after the other, as
+        `CmdStanMCMC.stan_variable`, read from the draws cache if there is one.
+        """
+        draws = self._variable_draws([name], inc_warmup=inc_warmup)[name]
+        return draws.reshape((-1,) + draws.shape[2:])
+
+    def draws_xr(self, vars=None, inc_warmup=False):
+        """
+        Returns the draws as an xarray Dataset with the dimensions of `CmdStanMCMC.draws_xr`, e.g. 'beta_dim_0',
+        read from the draws cache if there is one. Default returns all variables but the sampler diagnostics.
+        """
+        if vars is None:
+            vars = [name for name in stan_column_groups(self._column_names()) if not name.endswith("__")]
+        names = [vars] if isinstance(vars, str) else list(vars)
+        draws = self._variable_draws(names, inc_warmup=inc_warmup)
+        n_chains, n_draws = draws[names[0]].shape[:2]
+        return xr.Dataset({name: (("chain", "draw") + tuple(f"{name}_dim_{i}" for i in range(x.ndim - 2)), x)
+                           for name, x in draws.items()},
+                          coords={"chain": np.arange(1, n_chains + 1), "draw": np.arange(n_draws)})
+
+    def _is_cell_log_lik(self, n_columns):
+        """
+        True if log_lik has one column per cell of the weighted cell model instead of one per observation.
+        """
+        return "cell" in self.stan_data and n_columns == self.stan_data["C"]
 
     def fit_to_inference_data(self):
         """
         Converts the cmdstanpy fit object to an ArviZ InferenceData object.
+
+        Only the variables in `var_names` are converted if it is set, so that large
+        generated quantities are not read unless they are needed.
         """
-        var_names = np.array(self.fit.column_names)
+        var_names = np.array(self._column_names())
         var_names = var_names[~np.char.endswith(var_names, "__")]
         if_log_lik = "log_lik" if (np.sum(np.char.startswith(var_names, "log_lik"))>=1) else None
         if_y_hat =  "y_hat" if (np.sum(np.char.startswith(var_names, "y_hat"))>=1) else None
@@ -154,59 +403,358 @@ class stan_model:
             if count > 1:
                 # match count with the value length in coords_dict, return the key, add to dims_dict
                 dims_dict[param] = [key for key, value in coords_dict.items() if len(value) == count]
-        print(dims_dict)
+        # the weighted cell model writes one log_lik per cell, expanded to the observations for LOO
+        cell_log_lik = bool(if_log_lik) and self._is_cell_log_lik(np.sum(var_names == "log_lik"))
+        if cell_log_lik:
+            dims_dict["log_lik"] = ["participant"]
         self.dims_dict = dims_dict
-        self.az_data = az.from_cmdstanpy(
-            posterior=self.fit,
-            posterior_predictive=if_y_hat,
-            log_likelihood=if_log_lik,
+        self._cell_log_lik = cell_log_lik
+        if self.var_names is None and self.cache is None and self._fit is not None and not cell_log_lik:
+            self._az_data = az.from_cmdstanpy(
+                posterior=self.fit,
+                posterior_predictive=if_y_hat,
+                log_likelihood=if_log_lik,
+                observed_data={"y": self.stan_data["y"]},
+                coords=coords_dict,
+                dims=dims_dict,
+                save_warmup=self.inc_warmup,
+            )
+        else:
+            self._az_data = self._selected_inference_data(coords_dict, dims_dict)
+        return self._az_data
+
+    def _column_names(self):
+        """
+        Returns the column names of the draws without parsing the CSV files if possible.
+        """
+        if self.cache is not None:
+            return self.cache.column_names
+        if self._fit is None and self.csv_files is not None:
+            return read_stan_csv_header(self.csv_files[0])
+        return self.fit.column_names
+
+    def _selected_inference_data(self, coords_dict, dims_dict):
+        """
+        Builds the InferenceData object from the variables in `var_names`, or from all variables
+        if the draws come from the cache or the CSV parser.
+        """
+        groups = stan_column_groups(self._column_names())
+        names = [name for name in groups if not name.endswith("__")] if self.var_names is None else list(self.var_names)
+        # sampler diagnostics, named as in az.from_cmdstanpy
+        stats_names = {"lp__": "lp", "accept_stat__": "acceptance_rate", "stepsize__": "step_size",
+                       "treedepth__": "tree_depth", "n_leapfrog__": "n_steps", "divergent__": "diverging",
+                       "energy__": "energy"}
+        stats_names = {name: stat for name, stat in stats_names.items() if name in groups}
+        if self.cache is not None:
+            n_warmup = self.cache.num_draws_warmup
+            variable_draws = lambda name: self.cache.variable(name, inc_warmup=True)
+        elif self._fit is None:
+            # recovered without a cache: parse only the columns of the selected variables
+            draws, column_names, n_warmup = read_stan_csv(self.csv_files, vars=names + list(stats_names), inc_warmup=True)
+            variable_draws = split_variables(draws, column_names).get
+        else:
+            n_warmup = self.fit.num_draws_warmup if self.fit._save_warmup else 0
+            variable_draws = lambda name: self.fit.draws_xr(vars=[name], inc_warmup=self.fit._save_warmup)[name].values
+            stats_names = {}
+        sample_stats = {stat: variable_draws(name)[:, n_warmup:] for name, stat in stats_names.items()} or None
+        if sample_stats and "diverging" in sample_stats:
+            sample_stats["diverging"] = sample_stats["diverging"].astype(bool)
+        inc_warmup = self.inc_warmup and n_warmup > 0
+        # arrays of shape (chain, draw, ...) as expected by az.from_dict
+        draws = {name: variable_draws(name) for name in names}
+        if "log_lik" in draws and self._cell_log_lik:
+            draws["log_lik"] = draws["log_lik"][..., np.asarray(self.stan_data["cell"]) - 1]
+        params = [name for name in names if name not in ("log_lik", "y_hat")]
+        group = lambda selected: {name: draws[name][:, n_warmup:] for name in selected if name in names} or None
+        return az.from_dict(
+            posterior=group(params),
+            warmup_posterior={name: draws[name][:, :n_warmup] for name in params} if inc_warmup else None,
+            posterior_predictive=group(["y_hat"]),
+            log_likelihood=group(["log_lik"]),
+            sample_stats=sample_stats,
             observed_data={"y": self.stan_data["y"]},
             coords=coords_dict,
-            dims=dims_dict,
-            save_warmup=True,
+            dims={name: dims for name, dims in dims_dict.items() if name in names or name == "y"},
+            save_warmup=inc_warmup,
         )
-        if if_log_lik:
-            self.loo = az.loo(self.az_data, pointwise=True, scale="log")
-            print(self.loo)
 
-    def compile(self, user_header=None, **kwargs):
+    def compile(self, user_header=None, build_dir=None, force=False, threads=False, **kwargs):
         """
         Compiles the Stan model, making it ready for sampling.
+
+        The model is built out of tree in `build_dir`, by default the folder `.stan_build` next to
+        the Stan file, with its own copy of the user header in the namespace of this model. The
+        executable is reused as long as the Stan file, its includes, the header and the options
+        are unchanged. With `threads`, the model is built with STAN_THREADS, so that `reduce_sum`
+        runs on `threads_per_chain` threads when sampling.
         """
-        self.model = CmdStanModel(stan_file=self.stan_file, compile=False, **kwargs)
-        if user_header is not None:
-            bnb_hpp_dir = user_header.parent / 'bnb'
-            for file in Path(bnb_hpp_dir).rglob('*.hpp'):
-                self.change_namespace(file)
-        self.model.compile(force=False, user_header=user_header)
+        stanc_options = kwargs.pop("stanc_options", None)
+        cpp_options = kwargs.pop("cpp_options", None)
+        if threads:
+            cpp_options = dict(cpp_options or {}, STAN_THREADS=True)
+        try:
+            toolchain = cmdstan_path()
+        except ValueError:
+            toolchain = None
+        build = prepare_build(self.stan_file, build_dir or os.path.join(self.stan_dir, ".stan_build"),
+                              user_header=user_header, stanc_options=stanc_options,
+                              cpp_options=dict(cpp_options or {}, cmdstan=toolchain))
+        self.build = build
+        if force:
+            kwargs["force_compile"] = True
+        exe_file = build["exe_file"] if build["exe_file"].exists() and not force else None
+        self.model = CmdStanModel(stan_file=build["stan_file"], exe_file=exe_file,
+                                  stanc_options=build["stanc_options"], cpp_options=cpp_options,
+                                  user_header=build["user_header"], **kwargs)
 
-    def change_namespace(self, user_header):
+    def change_namespace(self, user_header, target=None):
         """
         Modifies the namespace in the user-provided header files, necessary in Stan.
+        The header is rewritten in place unless a `target` file is given.
         """
-        filepath = user_header
-        with open(filepath, 'r') as file:
-            lines = file.readlines()
-        with open(filepath, "w") as file:
-            for line in lines:
-                # Matches all characters except a single space character
-                match = re.match(r'^namespace (\S+)_model_namespace {', line)
-                if match:
-                    new_line = f'namespace {self.stan_name}_model_namespace {{\n'
-                    file.write(new_line)
-                else:
-                    file.write(line)
+        rewrite_namespace(user_header, target or user_header, self.stan_name)
 
-    def sample(self, stan_data, **kwargs):
+    def sample(self, stan_data, grainsize=None, warm_start=None, **kwargs):
         """
-        Samples from the posterior distribution of the compiled Stan model, and print the summary.
+        Samples from the posterior distribution of the compiled Stan model. The draws are
+        converted to `df`, `az_data` and `loo` only when these are first accessed.
+
+        `grainsize` sets the slice size of models using `reduce_sum`; together with
+        `threads_per_chain` it controls the within-chain parallelism.
+
+        `warm_start` takes a previous `stan_model` fit of the same model, e.g. before new waves were
+        added, and continues from it with a short warmup, see `warm_start_args`.
+
+        The timing, sampler statistics and profile() blocks of the run are stored in `performance`.
         """
+        if grainsize is not None:
+            stan_data = dict(stan_data, grainsize=grainsize)
         self.stan_data = stan_data
+        if warm_start is not None:
+            kwargs = self.warm_start_args(warm_start, stan_data, **kwargs)
+        # keep the profile CSV files with the output instead of overwriting profile.csv in the working directory
+        kwargs.setdefault("save_profile", True)
+        run = datetime.now().strftime("%Y%m%d%H%M%S")
+        start = time.perf_counter()
         self.fit = self.model.sample(data=self.stan_data, **kwargs)
-        self.df = self.fit.draws_pd()
-        display(self.df)
-        self.fit_to_inference_data()
-        display(self.az_data)
+        wall_time = time.perf_counter() - start
+        self.cache = None
+        self._reset_draws()
+        self.performance = self._performance_record(run, wall_time)
+
+    def warm_start_args(self, previous, stan_data, iter_warmup=150, **kwargs):
+        """
+        Builds the arguments of `CmdStanModel.sample` to continue from a previous fit on new data.
+
+        The parameters of the last draw of every chain are mapped onto the dimensions of the new data:
+        the entries present in both fits are kept and new entries, e.g. the added waves of `gp_w_z`,
+        repeat the last known entry along that axis. The adapted step size and the diagonal inverse
+        metric of every chain are reused, the variances of a resized parameter being resized the same
+        way or, for a resized matrix or array, set to the mean variance of that parameter. The warmup
+        then only has to adapt to the new data, so it is much shorter than a full one.
+
+        Args:
+            previous (stan_model): Fitted or recovered model with the same parameters.
+            stan_data (dict): The new data.
+            iter_warmup (int, optional): Number of warmup iterations. Default is 150.
+            **kwargs: Other arguments of `CmdStanModel.sample`, which take precedence over the warm start.
+
+        Returns:
+            dict: The arguments of `CmdStanModel.sample`, with 'inits', 'step_size' and 'metric' set.
+        """
+        parameters = list(self.model.src_info()["parameters"])
+        # shapes of the parameters for the new data, from a single iteration that evaluates no gradient
+        with tempfile.TemporaryDirectory(prefix=f"{self.stan_name}_probe_") as probe_dir:
+            probe = self.model.sample(data=stan_data, fixed_param=True, chains=1, iter_sampling=1,
+                                      output_dir=probe_dir, show_progress=False, show_console=False)
+            new_shapes = {name: dims for name, (_, _, dims) in stan_column_groups(probe.column_names).items()}
+        old_shapes = {name: dims for name, (_, _, dims) in stan_column_groups(previous._column_names()).items()}
+
+        draws = previous._variable_draws(parameters)
+        chains = kwargs.get("chains", 4)
+        n_old = next(iter(draws.values())).shape[0]
+        init_dir = tempfile.mkdtemp(prefix=f"{self.stan_name}_warm_")
+        inits = []
+        for chain in range(chains):
+            init = {name: _resize_edge(draws[name][chain % n_old, -1], new_shapes[name]) for name in parameters}
+            inits.append(os.path.join(init_dir, f"inits_{chain + 1}.json"))
+            write_stan_json(inits[-1], init)
+
+        fit = previous.fit
+        step_size = np.asarray(fit.step_size, dtype=float)
+        args = {"inits": inits, "step_size": [float(step_size[chain % n_old]) for chain in range(chains)]}
+        inv_metric = getattr(fit, "inv_metric", None)
+        if inv_metric is None:
+            inv_metric = fit.metric
+        old_sizes = [int(np.prod(old_shapes[name])) for name in parameters]
+        if fit.metric_type == "diag_e" and sum(old_sizes) == np.shape(inv_metric)[1]:
+            # the inverse metric is in the order of the unconstrained parameters, one block per parameter
+            blocks = np.split(np.asarray(inv_metric), np.cumsum(old_sizes)[:-1], axis=1)
+            metrics = []
+            for chain in range(chains):
+                metric = []
+                for name, block in zip(parameters, blocks):
+                    block = block[chain % n_old]
+                    if new_shapes[name] == old_shapes[name]:
+                        metric.append(block)
+                    elif len(new_shapes[name]) == 1:
+                        metric.append(_resize_edge(block, new_shapes[name]))
+                    else:
+                        metric.append(np.full(int(np.prod(new_shapes[name])), block.mean()))
+                metrics.append(os.path.join(init_dir, f"metric_{chain + 1}.json"))
+                write_stan_json(metrics[-1], {"inv_metric": np.concatenate(metric)})
+            args["metric"] = metrics
+        else:
+            print("The inverse metric of the previous fit cannot be mapped, it is adapted from scratch.")
+
+        # short windows: a few iterations to settle the step size, one metric window and the final step size
+        args.update(iter_warmup=iter_warmup, adapt_init_phase=max(iter_warmup // 10, 1),
+                    adapt_step_size=max(iter_warmup // 5, 1))
+        args["adapt_metric_window"] = max(iter_warmup - args["adapt_init_phase"] - args["adapt_step_size"], 1)
+        args.update(kwargs)
+        return args
+
+    def _performance_record(self, run, wall_time):
+        """
+        Collects the performance of the last run as a tidy DataFrame with one row per (chain, block, metric).
+
+        Block 'sampler' holds the warmup, sampling and total time of every chain, its leapfrog steps,
+        gradient evaluations (only known if the warmup draws are saved), divergences and the number of
+        draws that hit the maximum tree depth. The other blocks are the profile() blocks of the model.
+        Chain 0 stands for the whole run.
+        """
+        csv_files = self.fit.runset.csv_files
+        max_depth = int(self.fit.metadata.cmdstan_config.get("max_depth", 10))
+        rows = [(0, "sampler", "wall_time", wall_time)]
+        for chain, file in enumerate(csv_files):
+            # only the leading sampler columns are parsed
+            stats, n_warmup = read_sampler_stats(file)
+            timing = read_stan_csv_timing(file)
+            leapfrog_warmup = stats["n_leapfrog__"][:n_warmup].sum() if n_warmup else np.nan
+            leapfrog = stats["n_leapfrog__"][n_warmup:].sum()
+            metrics = {
+                "warmup_time": timing.get("warmup", np.nan),
+                "sampling_time": timing.get("sampling", np.nan),
+                "total_time": timing.get("total", np.nan),
+                "leapfrog_steps_warmup": leapfrog_warmup,
+                "leapfrog_steps": leapfrog,
+                "gradient_evaluations": leapfrog_warmup + leapfrog,
+                "divergences": stats["divergent__"][n_warmup:].sum(),
+                "treedepth_saturation": np.sum(stats["treedepth__"][n_warmup:] >= max_depth),
+            }
+            rows += [(chain + 1, "sampler", metric, float(value)) for metric, value in metrics.items()]
+
+        profile_files = [file for file in self.fit.runset.profile_files if os.path.exists(file)]
+        for i, file in enumerate(profile_files):
+            # one profile file per chain, or a single one if all chains ran in one process
+            chain = i + 1 if len(profile_files) == len(csv_files) else 0
+            profile = pd.read_csv(file).groupby("name").sum(numeric_only=True)
+            for block, row in profile.iterrows():
+                for metric in ["total_time", "forward_time", "reverse_time", "autodiff_calls", "no_autodiff_calls"]:
+                    rows.append((chain, block, metric, float(row[metric])))
+
+        performance = pd.DataFrame(rows, columns=["chain", "block", "metric", "value"])
+        performance.insert(0, "run", run)
+        performance.insert(0, "model", self.stan_name)
+        return performance
+
+    def pathfinder(self, stan_data, draws=4000, chains=4, **kwargs):
+        """
+        Approximates the posterior with Pathfinder instead of sampling, see `_approximate`.
+
+        Args:
+            stan_data (dict): The data.
+            draws (int, optional): Number of approximate draws. Default is 4000.
+            chains (int, optional): Number of chains the draws are split into. Default is 4.
+            **kwargs: Other arguments of `CmdStanModel.pathfinder`.
+        """
+        run = lambda: (self.model.pathfinder(data=stan_data, draws=draws, **kwargs), {})
+        self._approximate("pathfinder", stan_data, chains, run)
+
+    def laplace(self, stan_data, draws=4000, chains=4, jacobian=True, opt_args=None, **kwargs):
+        """
+        Finds the posterior mode with `optimize` and draws from the normal approximation at the mode,
+        see `_approximate`.
+
+        Args:
+            stan_data (dict): The data.
+            draws (int, optional): Number of approximate draws. Default is 4000.
+            chains (int, optional): Number of chains the draws are split into. Default is 4.
+            jacobian (bool, optional): Find the mode on the unconstrained scale. Default is True.
+            opt_args (dict, optional): Other arguments of `CmdStanModel.optimize`.
+            **kwargs: Other arguments of `CmdStanModel.laplace_sample`.
+        """
+        def run():
+            start = time.perf_counter()
+            mode = self.model.optimize(data=stan_data, jacobian=jacobian, seed=kwargs.get("seed"), **(opt_args or {}))
+            optimize_time = time.perf_counter() - start
+            laplace = self.model.laplace_sample(data=stan_data, mode=mode, draws=draws, jacobian=jacobian, **kwargs)
+            return laplace, {"optimize_time": optimize_time}
+        self._approximate("laplace", stan_data, chains, run)
+
+    def variational(self, stan_data, draws=4000, chains=4, **kwargs):
+        """
+        Approximates the posterior with ADVI instead of sampling, see `_approximate`.
+
+        Args:
+            stan_data (dict): The data.
+            draws (int, optional): Number of approximate draws. Default is 4000.
+            chains (int, optional): Number of chains the draws are split into. Default is 4.
+            **kwargs: Other arguments of `CmdStanModel.variational`, e.g. algorithm='fullrank'.
+        """
+        run = lambda: (self.model.variational(data=stan_data, output_samples=draws, **kwargs), {})
+        self._approximate("variational", stan_data, chains, run)
+
+    def _approximate(self, method, stan_data, chains, run):
+        """
+        Runs an approximate algorithm and stores its draws like those of `sample`.
+
+        The draws are split into `chains` chains and written as fixed_param sampler CSV files, so that
+        `fit` is a `CmdStanMCMC` object and `df`, `az_data`, `merge_hdi`, `save`, `recover_from_csv`
+        and `generate_quantities` work as for NUTS. The result of the algorithm itself is kept in
+        `approximation`. `performance` holds the wall time of the run in block `method`, and the
+        Pareto k of the importance ratios between the model and the approximation, where k > 0.7
+        means that the approximation is not reliable.
+        """
+        self.stan_data = stan_data
+        run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+        start = time.perf_counter()
+        approx, metrics = run()
+        wall_time = time.perf_counter() - start
+        self.approximation = approx
+
+        column_names = list(approx.column_names)
+        draws = approx.variational_sample if isinstance(approx, CmdStanVB) else approx.draws()
+        draws = np.asarray(draws)
+        # log density of the model and of the approximation, named differently by every algorithm
+        log_p = draws[:, column_names.index("log_p__" if "log_p__" in column_names else "lp__")]
+        log_q = [name for name in ("lp_approx__", "log_g__") if name in column_names]
+        if log_q:
+            _, pareto_k = az.psislw(log_p - draws[:, column_names.index(log_q[0])])
+            metrics["pareto_k"] = float(pareto_k)
+        params = [i for i, name in enumerate(column_names) if not name.endswith("__")]
+
+        config = approx.metadata.cmdstan_config
+        stan_version = tuple(int(config.get(f"stan_version_{part}", 0)) for part in ("major", "minor", "patch"))
+        output_dir = tempfile.mkdtemp(prefix=f"{self.stan_name}_{method}_")
+        n_draws = len(draws) // chains
+        csv_files = []
+        for chain in range(chains):
+            rows = slice(chain * n_draws, (chain + 1) * n_draws)
+            csv_files.append(os.path.join(output_dir, f"{self.stan_name}-{run_id}_{method}_{chain + 1}.csv"))
+            write_stan_csv(csv_files[-1], np.column_stack([log_p[rows], draws[rows][:, params]]),
+                           ["lp__"] + [column_names[i] for i in params], self.stan_name, stan_version=stan_version,
+                           seed=config.get("seed"), chain_id=chain + 1, elapsed=wall_time)
+        self.fit = from_csv(csv_files, method="sample")
+        self.cache = None
+        self._reset_draws()
+
+        metrics = dict(wall_time=wall_time, draws=chains * n_draws, **metrics)
+        performance = pd.DataFrame([(0, method, metric, float(value)) for metric, value in metrics.items()],
+                                   columns=["chain", "block", "metric", "value"])
+        performance.insert(0, "run", run_id)
+        performance.insert(0, "model", self.stan_name)
+        self.performance = performance
 
     def save(self, stan_save_dir=None):
         """
@@ -220,98 +768,356 @@ class stan_model:
             os.makedirs(self.stan_save_dir)
         self.fit.save_csvfiles(dir=self.stan_save_dir)
         self.csv_files = self.fit.runset.csv_files
+        if self.performance is not None:
+            # one record per run, appended so that runs can be compared
+            performance_file = os.path.join(self.stan_save_dir, self.stan_name + "_performance.csv")
+            self.performance.to_csv(performance_file, mode="a", index=False,
+                                    header=not os.path.exists(performance_file))
         # self.az_data.to_netcdf(os.path.join(self.stan_save_dir, self.stan_name+".nc"))
 
+    def to_draw_store(self, store, vars=None, exclude=None, **kwargs):
+        """
+        Writes the draws to a chunked zarr store, one chain at a time, see `draw_store.write_draw_store`.
+        The returned dataset is opened lazily, so only the variables and slices that are used are read.
+        """
+        csv_files = self.csv_files if self._fit is None else self.fit.runset.csv_files
+        return write_draw_store(store, csv_files, vars=vars, exclude=exclude, inc_warmup=self.inc_warmup, **kwargs)
 
 
 
+
+def _resize_edge(x, shape):
+    """
+    Resizes an array to `shape`, truncating each axis or padding it with its last entry.
+    """
+    x = np.asarray(x)
+    if x.ndim == 0:
+        return x
+    x = x[tuple(slice(0, n) for n in shape)]
+    return np.pad(x, [(0, n - m) for n, m in zip(shape, x.shape)], mode="edge")
+
+
 # -------------------------- BNB related functions --------------------------
 
-def beta_negative_binomial_rng(r, alpha, beta, size=1, seed=None):
+def spawn_generators(seed=None, n=1):
+    """
+    Create independent random number generators, e.g. one per parallel worker.
+
+    Args:
+        seed (int or SeedSequence, optional): Root seed from which the substreams are spawned.
+        n (int, optional): Number of generators. Default is 1.
+
+    Returns:
+        list: `n` statistically independent `np.random.Generator` objects.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(n)]
+
+def _bnb_draw(rng, r, alpha, beta, size=None):
+    # one p per sample: with size=None, rng.beta would draw a single p for scalar alpha, beta
+    # and share it across an array r, giving a Negative Binomial instead of a BNB
+    shape = np.broadcast_shapes(() if size is None else tuple(np.atleast_1d(size)),
+                                np.shape(r), np.shape(alpha), np.shape(beta))
+    p = rng.beta(alpha, beta, size=shape)
+    try:
+        # N Number of successes, p probability of success
+        return rng.negative_binomial(r, p, size=shape)
+    except ValueError as e:
+        # for a small alpha p can underflow to zero or be so small that the count overflows int64;
+        # there is no sample to return, as in neg_binomial_rng of Stan
+        raise Exception("beta_negative_binomial_rng: a draw of p is too small for a finite sample, "
+                        "alpha is too small.") from e
+
+def beta_negative_binomial_rng(r, alpha, beta, size=None, seed=None):
     """
     Generate random samples from a BNB distribution.
 
+    Args:
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution, broadcast against each other,
+                                              e.g. one value per (draw, cell).
+        size (int or tuple, optional): Output shape. Default is the broadcast shape of the parameters.
+        seed (int, SeedSequence or Generator, optional): Seed value or generator for the random numbers.
+                                                         The global `np.random` state is never touched.
+
+    Returns:
+        int or ndarray: Random samples from the BNB distribution.
+                        If all parameters are scalars and `size` is None, an integer is returned.
+                        An exception is raised if a draw of p is too small for a finite sample,
+                        which happens for a small alpha, e.g. 0.02.
+    """
+    rng = np.random.default_rng(seed)
+    samples = _bnb_draw(rng, r, alpha, beta, size)
+    return int(samples) if np.ndim(samples) == 0 else samples
+
+def beta_negative_binomial_rng_chunks(r, alpha, beta, size=None, chunk_size=1_000_000, seed=None):
+    """
+    Generate BNB random samples chunk by chunk, so that large simulations never live in memory at once.
+
+    The samples are produced in C order of the output shape; concatenating the chunks and reshaping
+    to that shape gives an array with the same distribution as `beta_negative_binomial_rng`, but not
+    the same values for a given seed, since the random stream is consumed chunk by chunk.
+
+    Args:
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution, broadcast against each other.
+        size (int or tuple, optional): Output shape. Default is the broadcast shape of the parameters.
+        chunk_size (int, optional): Maximum number of samples per chunk. Default is 1,000,000.
+        seed (int, SeedSequence or Generator, optional): Seed value or generator for the random numbers.
+
+    Yields:
+        ndarray: 1-D array of at most `chunk_size` samples.
+    """
+    rng = np.random.default_rng(seed)
+    shape = np.broadcast_shapes(*(np.shape(x) for x in (r, alpha, beta)))
+    if size is not None:
+        shape = np.broadcast_shapes((size,) if np.ndim(size) == 0 else tuple(size), shape)
+    params = [np.broadcast_to(np.asarray(x, dtype=float), shape) for x in (r, alpha, beta)]
+    total = int(np.prod(shape))
+    for start in range(0, total, chunk_size):
+        index = np.unravel_index(np.arange(start, min(start + chunk_size, total)), shape)
+        yield _bnb_draw(rng, *(x[index] for x in params))
+
+def count_histogram(data, counts=None):
+    """
+    Compress observations into unique values and their counts.
+
+    Args:
+        data (array-like): Observed data points, or unique values if `counts` is given.
+        counts (array-like, optional): Number of occurrences of each value in `data`.
+
+    Returns:
+        tuple: A tuple containing:
+               - ndarray of unique values.
+               - ndarray of counts (as float weights) for each value.
+    """
+    data = np.asarray(data)
+    if counts is None:
+        values, counts = np.unique(data, return_counts=True)
+        return values, counts.astype(float)
+    counts = np.asarray(counts, dtype=float)
+    if data.shape != counts.shape:
+        raise Exception("data and counts must have the same shape.")
+    return data, counts
+
+def poi_log_likelihood(mu, values, counts):
+    """
+    Weighted Poisson log-likelihood with its exact gradient and Hessian.
+
+    Args:
+        mu (float): Mean of the Poisson distribution.
+        values, counts (ndarray): Unique observed values and their counts.
+
+    Returns:
+        tuple: Log-likelihood, gradient w.r.t. (mu,) and Hessian of shape (1, 1).
+    """
+    ll = np.sum(counts * (values * np.log(mu) - mu - gammaln(values + 1)))
+    grad = np.array([np.sum(counts * (values / mu - 1))])
+    hess = np.array([[-np.sum(counts * values) / mu**2]])
+    return ll, grad, hess
+
+def nb_log_likelihood(r, p, values, counts):
+    """
+    Weighted Negative Binomial log-likelihood with its exact gradient and Hessian.
+
+    Args:
+        r, p (float): Parameters of the Negative Binomial distribution, as in `scipy.stats.nbinom`.
+        values, counts (ndarray): Unique observed values and their counts.
+
+    Returns:
+        tuple: Log-likelihood, gradient w.r.t. (r, p) and Hessian of shape (2, 2).
+    """
+    ll = np.sum(counts * (gammaln(values + r) - gammaln(r) - gammaln(values + 1)
+                          + r * np.log(p) + values * np.log1p(-p)))
+    grad = np.array([
+        np.sum(counts * (digamma(values + r) - digamma(r) + np.log(p))),
+        np.sum(counts * (r / p - values / (1 - p))),
+    ])
+    h_rr = np.sum(counts * (polygamma(1, values + r) - polygamma(1, r)))
+    h_rp = np.sum(counts) / p
+    h_pp = -np.sum(counts * (r / p**2 + values / (1 - p)**2))
+    hess = np.array([[h_rr, h_rp], [h_rp, h_pp]])
+    return ll, grad, hess
+
+def bnb_log_likelihood(r, alpha, beta, values, counts):
+    """
+    Weighted BNB log-likelihood with its exact (digamma/trigamma based) gradient and Hessian.
+
     Args:
         r, alpha, beta (float): Parameters of the BNB distribution.
-        size (int, optional): Number of samples to generate. Default is 1.
-        seed (int, optional): Seed value for random number generator.
+        values, counts (ndarray): Unique observed values and their counts.
 
     Returns:
-        int or ndarray: Random samples from the BNB distribution. 
-                        If `size` is 1, an integer is returned. Otherwise, an array of integers.
+        tuple: Log-likelihood, gradient w.r.t. (r, alpha, beta) and Hessian of shape (3, 3).
     """
-    if seed is not None:
-        np.random.seed(seed)
-    p = stats.beta.rvs(alpha, beta, size=size)
-    # N Number of successes, p probability of success
-    return stats.nbinom.rvs(n=r, p=p)
+    total = values + r + alpha + beta
+    ll = np.sum(counts * (betaln(r + values, alpha + beta) - betaln(r, alpha)
+                          + gammaln(values + beta) - gammaln(values + 1) - gammaln(beta)))
 
-def poi_mle_fit(data):
+    d_total = digamma(total)
+    grad = np.array([
+        np.sum(counts * (digamma(values + r) - d_total)) - np.sum(counts) * (digamma(r) - digamma(r + alpha)),
+        np.sum(counts * -d_total) + np.sum(counts) * (digamma(alpha + beta) - digamma(alpha) + digamma(r + alpha)),
+        np.sum(counts * (digamma(values + beta) - d_total)) + np.sum(counts) * (digamma(alpha + beta) - digamma(beta)),
+    ])
+
+    n = np.sum(counts)
+    t_total = np.sum(counts * polygamma(1, total))
+    t_r_alpha = n * polygamma(1, r + alpha)
+    t_alpha_beta = n * polygamma(1, alpha + beta)
+    h_rr = np.sum(counts * polygamma(1, values + r)) - t_total - n * polygamma(1, r) + t_r_alpha
+    h_aa = t_alpha_beta - t_total - n * polygamma(1, alpha) + t_r_alpha
+    h_bb = t_alpha_beta - t_total + np.sum(counts * polygamma(1, values + beta)) - n * polygamma(1, beta)
+    h_ra = t_r_alpha - t_total
+    h_rb = -t_total
+    h_ab = t_alpha_beta - t_total
+    hess = np.array([[h_rr, h_ra, h_rb], [h_ra, h_aa, h_ab], [h_rb, h_ab, h_bb]])
+    return ll, grad, hess
+
+def _mle_standard_errors(hess):
+    """
+    Asymptotic standard errors from the Hessian of the log-likelihood at the MLE.
+    """
+    try:
+        return np.sqrt(np.diag(np.linalg.inv(-hess)))
+    except np.linalg.LinAlgError:
+        return np.full(hess.shape[0], np.nan)
+
+def poi_mle_fit(data, counts=None, return_se=False):
     """
     Calculate the MLE for the mean (mu) of Poisson distribution given the data.
 
+    The MLE is the mean of the data, i.e. the count-weighted mean of the histogram.
+
     Args:
-        data (array-like): Observed data points.
+        data (array-like): Observed data points, or unique values if `counts` is given.
+        counts (array-like, optional): Number of occurrences of each value in `data`.
+        return_se (bool, optional): Also return the asymptotic standard error. Default is False.
 
     Returns:
         float: MLE of the mean (mu) of Poisson distribution.
+               If `return_se` is True, a tuple of the MLE and its standard error.
     """
-    def poisson_log_likelihood(mu, data):
-        return -np.sum(stats.poisson.logpmf(data, mu))
-
-    result = minimize(poisson_log_likelihood, [1], args=(data), method='L-BFGS-B')
-    return result.x[0]
+    values, counts = count_histogram(data, counts)
+    mu = np.average(values, weights=counts)
+    if return_se:
+        return mu, _mle_standard_errors(poi_log_likelihood(mu, values, counts)[2])[0]
+    return mu
 
-def nb_mle_fit(data):
+def nb_mle_fit(data, counts=None, return_se=False):
     """
     Calculate the MLEs for parameters of the Negative Binomial distribution given the data.
 
+    The optimizer works on (log r, logit p) with the exact gradient.
+
     Args:
-        data (array-like): Observed data points.
+        data (array-like): Observed data points, or unique values if `counts` is given.
+        counts (array-like, optional): Number of occurrences of each value in `data`.
+        return_se (bool, optional): Also return the asymptotic standard errors. Default is False.
 
     Returns:
         tuple: A tuple containing:
                - MLE of r (number of successes until the experiment is stopped).
                - MLE of p (probability of a single success).
+               If `return_se` is True, a tuple of the MLEs and an array of their standard errors.
     """
-    def negative_binomial_log_likelihood(params, data):
-        r, log_p = params
-        p = np.exp(log_p) / (1 + np.exp(log_p))
-        return -np.sum(stats.nbinom.logpmf(data, r, p))
+    values, counts = count_histogram(data, counts)
+
+    def neg_log_likelihood(theta):
+        r, p = np.exp(theta[0]), expit(theta[1])
+        ll, grad, _ = nb_log_likelihood(r, p, values, counts)
+        return -ll, -grad * np.array([r, p * (1 - p)])
 
-    result = minimize(negative_binomial_log_likelihood, [1, 0], args=(data), bounds=[(0.001, None), (None, None)], method='L-BFGS-B')
-    r = result.x[0]
-    p = np.exp(result.x[1]) / (1 + np.exp(result.x[1]))
+    result = minimize(neg_log_likelihood, [0, 0], jac=True, method='L-BFGS-B')
+    r, p = np.exp(result.x[0]), expit(result.x[1])
+    if return_se:
+        return (r, p), _mle_standard_errors(nb_log_likelihood(r, p, values, counts)[2])
     return r, p
 
-def bnb_mle_fit(data):
+def bnb_canonical_params(r, alpha, beta):
+    """
+    Swap r and beta so that r <= beta.
+
+    The BNB distribution is symmetric in r and beta, so (r, alpha, beta) and (beta, alpha, r) are the
+    same distribution and an optimizer can end on either branch. Fits and bootstrap replicates are
+    reported on the branch r <= beta, so that r and beta always mean the same parameter.
+
+    Args:
+        r, alpha, beta (float or array-like): Parameters of the BNB distribution.
+
+    Returns:
+        tuple: The parameters (min(r, beta), alpha, max(r, beta)).
+    """
+    return np.minimum(r, beta), alpha, np.maximum(r, beta)
+
+def bnb_mle_fit(data, counts=None, return_se=False):
     """
     Calculate the MLEs for parameters of the BNB distribution given the data.
 
+    The optimizer works on (log r, log alpha, log beta) with the exact gradient,
+    so no parameter can get stuck on a bound.
+
     Args:
-        data (array-like): Observed data points.
+        data (array-like): Observed data points, or unique values if `counts` is given.
+        counts (array-like, optional): Number of occurrences of each value in `data`.
+        return_se (bool, optional): Also return the asymptotic standard errors. Default is False.
 
     Returns:
         tuple: A tuple containing:
                - MLE of r (size parameter).
                - MLE of alpha.
                - MLE of beta.
+               If `return_se` is True, a tuple of the MLEs and an array of their standard errors.
+               The estimates are swapped so that r <= beta, see `bnb_canonical_params`.
     """
-    def beta_negative_binomial_log_likelihood(params, data):
-        alpha, beta, log_r = params
-        r = np.exp(log_r)
-        log_likelihood = (
-            betaln(r + data, alpha + beta) - betaln(r, alpha)
-            + gammaln(data + beta) - gammaln(data + 1) - gammaln(beta)
-        )
-        return -np.sum(log_likelihood)
+    values, counts = count_histogram(data, counts)
+
+    def neg_log_likelihood(theta):
+        params = np.exp(theta)
+        ll, grad, _ = bnb_log_likelihood(*params, values, counts)
+        return -ll, -grad * params
 
-    bounds = [(0.001, None), (0.001, None), (None, None)]
-    result = minimize(beta_negative_binomial_log_likelihood, [1, 1, 0], args=(data), bounds=bounds, method='L-BFGS-B')
-    alpha_mle, beta_mle, log_r_mle = result.x
-    r_mle = np.exp(log_r_mle)
+    # the BNB likelihood is symmetric in r and beta, so start off the r == beta ridge (a saddle)
+    result = minimize(neg_log_likelihood, [1, 0, -1], jac=True, method='L-BFGS-B')
+    r_mle, alpha_mle, beta_mle = bnb_canonical_params(*np.exp(result.x))
+    if return_se:
+        hess = bnb_log_likelihood(r_mle, alpha_mle, beta_mle, values, counts)[2]
+        return (r_mle, alpha_mle, beta_mle), _mle_standard_errors(hess)
     return r_mle, alpha_mle, beta_mle
 
+MLE_FITTERS = {
+    'poisson': (poi_mle_fit, ['mu']),
+    'nbinom': (nb_mle_fit, ['r', 'p']),
+    'bnb': (bnb_mle_fit, ['r', 'alpha', 'beta']),
+}
+
+def mle_fit_groups(df, value, by, families=('poisson', 'nbinom', 'bnb')):
+    """
+    Fit several count distributions by MLE to every group of a dataframe in one call.
+
+    Each group is compressed to a unique-value histogram once and shared by all families.
+
+    Args:
+        df (DataFrame): Data containing the observations and the grouping columns.
+        value (str): Name of the column with the observed counts, e.g. 'nhh_nct'.
+        by (str or list): Grouping column(s), e.g. ['wave_grp', 'pt_sex'].
+        families (iterable, optional): Keys of `MLE_FITTERS` to fit. Default fits all of them.
+
+    Returns:
+        DataFrame: A tidy dataframe with the grouping columns, 'family', 'param', 'estimate' and 'se'
+                   (asymptotic standard error), plus 'n' (observations) and 'n_unique' (distinct values) per group.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    rows = []
+    for keys, group in df.groupby(by, sort=True):
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        values, counts = count_histogram(group[value].to_numpy())
+        for family in families:
+            fitter, params = MLE_FITTERS[family]
+            estimates, ses = fitter(values, counts, return_se=True)
+            for param, estimate, se in zip(params, np.atleast_1d(estimates), np.atleast_1d(ses)):
+                rows.append((*keys, family, param, estimate, se, int(counts.sum()), len(values)))
+    return pd.DataFrame(rows, columns=by + ['family', 'param', 'estimate', 'se', 'n', 'n_unique'])
+
 def beta_neg_binomial_pmf(y, r, a, b):
     """
     Compute the PMF of the BNB distribution.
@@ -326,21 +1132,280 @@ def beta_neg_binomial_pmf(y, r, a, b):
     lprobs = betaln(r+y,a+b) - betaln(r,a) + gammaln(y+b) - gammaln(y+1) - gammaln(b)
     return np.exp(lprobs)
 
+def beta_neg_binomial_lpmf_table(y_max, r, a, b):
+    """
+    Compute the log PMF of the BNB distribution on the whole support 0, 1, ..., y_max.
+
+    Args:
+        y_max (int): The largest value of the support to evaluate.
+        r, a, b (float or array-like): Parameters of the BNB distribution, broadcast against each other.
+
+    Returns:
+        ndarray: Log PMF values of shape (y_max+1, *broadcast(r, a, b).shape).
+    """
+    r, a, b = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (r, a, b)))
+    y = np.arange(int(y_max) + 1, dtype=float).reshape((-1,) + (1,) * r.ndim)
+    return betaln(r+y, a+b) - betaln(r, a) + gammaln(y+b) - gammaln(y+1) - gammaln(b)
+
+def _bnb_gather_lcdf(y, r, a, b):
+    """
+    Evaluate the log CDF of the BNB distribution at `y` with a single pass over the support.
+
+    The log PMF is computed once up to max(y), accumulated with a running log-sum-exp and
+    the requested points are gathered from the cumulative table.
+
+    Args:
+        y (array-like): Values at which to evaluate the log CDF.
+        r, a, b (float or array-like): Parameters of the BNB distribution.
+
+    Returns:
+        ndarray: Log CDF values of shape broadcast(y, r, a, b).shape.
+    """
+    y = np.floor(np.asarray(y, dtype=float))
+    r, a, b = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (r, a, b)))
+    shape = np.broadcast_shapes(y.shape, r.shape)
+    y_max = int(max(np.max(y, initial=0), 0))
+
+    lcdf_table = np.logaddexp.accumulate(beta_neg_binomial_lpmf_table(y_max, r, a, b), axis=0)
+    lcdf_table = lcdf_table.reshape((y_max+1,) + (1,) * (len(shape) - r.ndim) + r.shape)
+    lcdf_table = np.broadcast_to(lcdf_table, (y_max+1,) + shape)
+    index = np.broadcast_to(np.clip(y, 0, y_max).astype(np.intp), shape)
+    lcdf = np.take_along_axis(lcdf_table, index[np.newaxis], axis=0)[0]
+    return np.where(np.broadcast_to(y, shape) < 0, -np.inf, np.minimum(lcdf, 0.0))
+
+def _bnb_upper_tail(y, r, a, b, block=256, max_steps=100000):
+    """
+    Sum the PMF of the BNB distribution from y + 1 upwards, `block` values of the support at a time.
+
+    The sum stops once the terms decrease and no longer change it, which is the 3F2 series of the
+    C++ header, or after `max_steps` terms, as heavy tails converge too slowly.
+
+    Args:
+        y, r, a, b (ndarray): 1-D arrays of the values and of the parameters of the BNB distribution.
+        block (int, optional): Number of terms added per step. Default is 256.
+        max_steps (int, optional): Maximum number of terms. Default is 100000.
+
+    Returns:
+        tuple: A tuple containing:
+               - ndarray of log P(Y > y).
+               - ndarray of bool, True where the sum converged.
+    """
+    ltail = np.full(y.size, -np.inf)
+    converged = np.zeros(y.size, dtype=bool)
+    active = np.arange(y.size)
+    log_eps = np.log(np.finfo(float).eps)
+    for start in range(1, max_steps + 1, block):
+        k = y[active] + np.arange(start, start + block)[:, np.newaxis]
+        r_k, a_k, b_k = r[active], a[active], b[active]
+        lp = betaln(r_k + k, a_k + b_k) - betaln(r_k, a_k) + gammaln(k + b_k) - gammaln(k + 1) - gammaln(b_k)
+        ltail[active] = np.logaddexp(ltail[active], logsumexp(lp, axis=0))
+        done = (lp[-1] < lp[-2]) & (lp[-1] < ltail[active] + log_eps)
+        converged[active[done]] = True
+        active = active[~done]
+        if active.size == 0:
+            break
+    return ltail, converged
+
+def beta_neg_binomial_lcdf(y, r, a, b):
+    """
+    Compute the log CDF of the BNB distribution.
+
+    Args:
+        y (array-like): Values at which to evaluate the log CDF.
+        r, a, b (float or array-like): Parameters of the BNB distribution, broadcast against `y`.
+
+    Returns:
+        ndarray: Log CDF values for the provided `y` based on the BNB distribution.
+    """
+    return _bnb_gather_lcdf(y, r, a, b)
+
 def beta_neg_binomial_cdf(y, r, a, b):
     """
     Compute the CDF of the BNB distribution.
 
     Args:
         y (array-like): Values at which to evaluate the CDF.
-        r, a, b (float): Parameters of the BNB distribution.
+        r, a, b (float or array-like): Parameters of the BNB distribution, broadcast against `y`.
 
     Returns:
         ndarray: CDF values for the provided `y` based on the BNB distribution.
     """
-    cdfs = np.zeros(len(y))
-    for i, yi in enumerate(y):
-        cdfs[i] = np.sum(beta_neg_binomial_pmf(np.arange(yi+1), r, a, b))
-    return cdfs
+    return np.exp(_bnb_gather_lcdf(y, r, a, b))
+
+def beta_neg_binomial_lccdf(y, r, a, b):
+    """
+    Compute the log complementary CDF, log P(Y > y), of the BNB distribution.
+
+    Args:
+        y (array-like): Values at which to evaluate the log CCDF.
+        r, a, b (float or array-like): Parameters of the BNB distribution, broadcast against `y`.
+
+    Returns:
+        ndarray: Log CCDF values for the provided `y` based on the BNB distribution.
+    """
+    y = np.floor(np.asarray(y, dtype=float))
+    lcdf = _bnb_gather_lcdf(y, r, a, b)
+    # log(1 - exp(x)), switching branches at log(1/2) to avoid cancellation
+    with np.errstate(divide='ignore'):
+        lccdf = np.where(lcdf > -np.log(2), np.log(-np.expm1(lcdf)), np.log1p(-np.exp(lcdf)))
+    # far in the upper tail 1 - CDF rounds off, so tails holding less than 1e-3 of the mass are summed directly
+    tail = (lcdf > np.log1p(-1e-3)) & (np.broadcast_to(y, lcdf.shape) >= 0)
+    if np.any(tail):
+        params = [np.broadcast_to(np.asarray(x, dtype=float), lcdf.shape)[tail] for x in (y, r, a, b)]
+        ltail, converged = _bnb_upper_tail(*params)
+        lccdf[tail] = np.where(converged, ltail, lccdf[tail])
+    return lccdf
+
+def beta_neg_binomial_ccdf(y, r, a, b):
+    """
+    Compute the complementary CDF, P(Y > y), of the BNB distribution.
+
+    Args:
+        y (array-like): Values at which to evaluate the CCDF.
+        r, a, b (float or array-like): Parameters of the BNB distribution, broadcast against `y`.
+
+    Returns:
+        ndarray: CCDF values for the provided `y` based on the BNB distribution.
+    """
+    return np.exp(beta_neg_binomial_lccdf(y, r, a, b))
+
+def trunc_bnb_summary(a, rho, k, y_max, thresholds=(0, 1, 2, 4, 9), chunk_size=20000):
+    """
+    Compute summaries of the BNB distribution truncated at y_max for whole arrays of posterior draws.
+
+    This is the NumPy counterpart of `trunc_bnb_summary` in `src/cpp/bnb/trunc_bnb_summary.hpp`, and of
+    `trunc_bnb_mean`, `trunc_bnb_var`, `trunc_bnb_ccdf` and `trunc_bnb_cdf` in `src/stan/bnb_functions.stan`,
+    with parameters named as in the Stan model.
+    The normalized PMF on 0, 1, ..., y_max is computed once per block of `chunk_size` parameter
+    tuples and all summaries are read off it.
+
+    Args:
+        a, rho, k (array-like): Parameters of the BNB distribution broadcast against each other,
+                                e.g. `bnb_a` of shape (draws, G, A, T) and `bnb_k[:, None, None, None]`.
+        y_max (int): The truncation point for the distribution.
+        thresholds (array-like, optional): Values y at which P(Y > y) is evaluated. Default is (0, 1, 2, 4, 9).
+        chunk_size (int, optional): Number of parameter tuples per block. Default is 20000.
+
+    Returns:
+        dict: Arrays of the broadcast parameter shape with keys 'mean', 'var' and 'zero' (P(Y = 0)),
+              and 'ccdf' with an extra trailing axis over `thresholds`.
+    """
+    a, rho, k = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (a, rho, k)))
+    shape = a.shape
+    a, rho, k = (x.reshape(-1) for x in (a, rho, k))
+    thresholds = np.asarray(thresholds, dtype=np.intp)
+
+    y = np.arange(y_max + 1, dtype=float)[:, np.newaxis]
+    lgamma_y1 = gammaln(y + 1)
+    # P(Y > t) is the tail sum from t+1; thresholds at or beyond y_max have no mass above them
+    tail_index = np.minimum(thresholds + 1, y_max + 1)
+
+    mean, var, zero = (np.empty(a.size) for _ in range(3))
+    ccdf = np.empty((a.size, thresholds.size))
+    for start in range(0, a.size, chunk_size):
+        sl = slice(start, start + chunk_size)
+        # terms constant in y cancel in the normalization
+        lprobs = betaln(y + a[sl], rho[sl] + k[sl]) + gammaln(y + k[sl]) - lgamma_y1
+        probs = np.exp(lprobs - np.max(lprobs, axis=0))
+        probs /= np.sum(probs, axis=0)
+
+        EY = y[:, 0] @ probs
+        mean[sl] = EY
+        var[sl] = (y[:, 0]**2) @ probs - EY**2
+        zero[sl] = probs[0]
+        tail = np.concatenate([np.cumsum(probs[::-1], axis=0)[::-1], np.zeros((1, probs.shape[1]))])
+        ccdf[sl] = tail[tail_index].T
+
+    return {
+        'mean': mean.reshape(shape),
+        'var': var.reshape(shape),
+        'zero': zero.reshape(shape),
+        'ccdf': ccdf.reshape(shape + (thresholds.size,)),
+    }
+
+def trunc_nb_mean(a, mu, c):
+    """
+    Compute the mean of a Negative Binomial distribution with mean mu and dispersion a, truncated at c.
+
+    Args:
+        a, mu (array-like): Dispersion and mean of the Negative Binomial distribution, as `neg_binomial_2` in Stan.
+        c (int): The truncation point for the distribution.
+
+    Returns:
+        ndarray: The mean of the truncated Negative Binomial distribution.
+    """
+    p = a / (a + mu)
+    log_ratio = stats.nbinom.logpmf(c + 1, a, p) - stats.nbinom.logcdf(c, a, p)
+    return mu - (a + mu) * (c + 1) * np.exp(log_ratio) / a
+
+def bnb_var_components(a, rho, k, y_max, n_nodes=64, chunk_size=20000):
+    """
+    Compute the variance components of the BNB distribution truncated at y_max for whole arrays of draws.
+
+    NumPy counterpart of `bnb_var_components` in `src/stan/bnb_functions.stan`. The BNB is a
+    Negative Binomial with mean nu = a * X and dispersion a, where X follows a Beta-prime(k, rho)
+    distribution. With X = B / (1 - B) and B ~ Beta(k, rho), the expectations over nu become
+    Gauss–Jacobi quadratures on [0, 1], so no adaptive integration is needed.
+
+    Args:
+        a, rho, k (array-like): Parameters of the BNB distribution broadcast against each other.
+        y_max (int): The maximum value for the support of the distribution.
+        n_nodes (int, optional): Number of Gauss–Jacobi nodes. Default is 64.
+        chunk_size (int, optional): Number of parameter tuples per block. Default is 20000.
+
+    Returns:
+        ndarray: Array with a trailing axis of size 4 holding, as in Stan, the truncated mean, the
+                 remaining (within-nu) variance, Var(E[Y | nu]) and the total truncated variance.
+    """
+    a, rho, k = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (a, rho, k)))
+    shape = a.shape
+    a, rho, k = (x.reshape(-1) for x in (a, rho, k))
+
+    # Gauss–Jacobi rules depend only on (rho, k), which repeat across ages, genders and times
+    pairs, inverse = np.unique(np.stack([rho, k], axis=1), axis=0, return_inverse=True)
+    nodes, weights = np.empty((len(pairs), n_nodes)), np.empty((len(pairs), n_nodes))
+    for i, (rho_i, k_i) in enumerate(pairs):
+        # weight (1-x)^(rho-1) (1+x)^(k-1) on [-1, 1] is the Beta(k, rho) density of b = (1+x)/2
+        x, w = roots_jacobi(n_nodes, rho_i - 1, k_i - 1)
+        nodes[i], weights[i] = (1 + x) / 2, w / np.sum(w)
+    inverse = inverse.reshape(-1)
+
+    Var_nu_E_Y_nb = np.empty(a.size)
+    for start in range(0, a.size, chunk_size):
+        sl = slice(start, start + chunk_size)
+        b, w = nodes[inverse[sl]], weights[inverse[sl]]
+        a_sl = a[sl, np.newaxis]
+        E_Y_nu = trunc_nb_mean(a_sl, a_sl * b / (1 - b), y_max)
+        E_nu = np.sum(w * E_Y_nu, axis=1)
+        E_nu2 = np.sum(w * E_Y_nu**2, axis=1)
+        Var_nu_E_Y_nb[sl] = E_nu2 - E_nu**2
+
+    summary = trunc_bnb_summary(a, rho, k, y_max, thresholds=(), chunk_size=chunk_size)
+    vars = np.empty((a.size, 4))
+    vars[:, 0] = summary['mean']
+    vars[:, 2] = Var_nu_E_Y_nb
+    vars[:, 3] = summary['var']
+    vars[:, 1] = vars[:, 3] - vars[:, 0] - vars[:, 2]
+    return vars.reshape(shape + (4,))
+
+@lru_cache(maxsize=32)
+def zipf_harmonic_table(s, N):
+    """
+    Build the cumulative generalized harmonic numbers H(s, n) for n = 0, 1, ..., N.
+
+    The table is cached per (s, N) in a bounded LRU cache, so repeated Zipf queries on the
+    same parameters cost a single gather.
+
+    Args:
+        s (float): Exponent in the harmonic function.
+        N (int): Upper bound for the summation.
+
+    Returns:
+        ndarray: Read-only array of length N+1 whose n-th entry is H(s, n), with H(s, 0) = 0.
+    """
+    table = np.concatenate([[0.0], np.cumsum(np.arange(1, N+1, dtype=float) ** -s)])
+    table.setflags(write=False)
+    return table
 
 def H(a, N=None):
     """
@@ -356,7 +1421,7 @@ def H(a, N=None):
     if N is None:
         return zeta(a)
     else:
-        return np.sum(1/np.arange(1,N+1)**a)
+        return zipf_harmonic_table(float(a), int(N))[-1]
 
 def zipf_pdf(x, s, N):
     """
@@ -365,31 +1430,70 @@ def zipf_pdf(x, s, N):
     Args:
         x (array-like): Values at which to evaluate the PDF.
         s (float): Exponent characterizing the distribution.
-        N (int): Upper bound for the summation in the Zipf distribution.
+        N (int): Upper bound for the summation in the Zipf distribution. If None, the distribution is untruncated.
 
     Returns:
         ndarray: PDF values for the provided `x` based on the Zipf distribution.
     """
-    x = np.asarray(x)
-    mask = (x >= 1) & (x <= N)
-    pdf_values = 1 / (x[mask] ** s * H(s,N))
-    result = np.zeros_like(x, dtype=float)
-    result[mask] = pdf_values
-    return result
+    x = np.asarray(x, dtype=float)
+    mask = (x >= 1) if N is None else (x >= 1) & (x <= N)
+    return np.where(mask, np.where(mask, x, 1.0) ** -s / H(s, N), 0.0)
 
 def zipf_cdf(x, s, N):
     """
     Compute the CDF of the Zipf distribution.
 
     Args:
-        x (float): Values at which to evaluate the CDF.
+        x (array-like): Values at which to evaluate the CDF.
         s (float): Exponent characterizing the distribution.
-        N (int): Upper bound for the summation in the Zipf distribution.
+        N (int): Upper bound for the summation in the Zipf distribution. If None, the distribution is
+                 untruncated and the CDF is evaluated through the Hurwitz zeta function.
 
     Returns:
         ndarray: CDF values for the provided `x` based on the Zipf distribution.
     """
-    x = np.asarray(x)
-    cdf_values = [np.sum(1 / np.arange(1, xi + 1) ** s) for xi in x]
-    result = np.asarray(cdf_values) / H(s,N)
-    return result
\ No newline at end of file
+    return 1 - zipf_ccdf(x, s, N)
+
+def zipf_ccdf(x, s, N):
+    """
+    Compute the complementary CDF, P(X > x), of the Zipf distribution.
+
+    Args:
+        x (array-like): Values at which to evaluate the CCDF.
+        s (float): Exponent characterizing the distribution.
+        N (int): Upper bound for the summation in the Zipf distribution. If None, the distribution is
+                 untruncated and the CCDF is evaluated through the Hurwitz zeta function.
+
+    Returns:
+        ndarray: CCDF values for the provided `x` based on the Zipf distribution.
+    """
+    x = np.maximum(np.floor(np.asarray(x, dtype=float)), 0)
+    if N is None:
+        # sum_{k > x} k^-s = zeta(s, x+1)
+        return zeta(s, x + 1) / zeta(s)
+    table = zipf_harmonic_table(float(s), int(N))
+    x = np.minimum(x, N).astype(np.intp)
+    return (table[-1] - table[x]) / table[-1]
+
+def zipf_mle_fit(data, counts=None, N=None):
+    """
+    Calculate the MLE for the exponent (s) of the Zipf distribution given the data.
+
+    Args:
+        data (array-like): Observed data points (>= 1), or unique values if `counts` is given.
+        counts (array-like, optional): Number of occurrences of each value in `data`.
+        N (int, optional): Upper bound of the Zipf distribution. If None, the distribution is untruncated.
+
+    Returns:
+        float: MLE of the exponent (s) of the Zipf distribution.
+    """
+    values, counts = count_histogram(data, counts)
+    sum_log_x, n = np.sum(counts * np.log(values)), np.sum(counts)
+
+    def zipf_log_likelihood(s):
+        return s * sum_log_x + n * np.log(H(s, N))
+
+    # the untruncated normalizing constant zeta(s) only exists for s > 1
+    lower = 1 + 1e-6 if N is None else 1e-6
+    result = minimize_scalar(zipf_log_likelihood, bounds=(lower, 20), method='bounded')
+    return result.x
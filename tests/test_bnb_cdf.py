@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from scipy.special import logsumexp
+
+from utils import (beta_neg_binomial_lcdf, beta_neg_binomial_lccdf, beta_neg_binomial_ccdf,
+                   beta_neg_binomial_lpmf_table)
+
+
+def upper_tail(y, r, a, b, n_terms=200000):
+    """
+    log P(Y > y) as the sum of the PMF from y + 1 over `n_terms` terms, for tails that decay fast.
+    """
+    return logsumexp(beta_neg_binomial_lpmf_table(y + n_terms, r, a, b)[y + 1:])
+
+@pytest.mark.parametrize("y, r, a, b", [(5, 6.0, 12.0, 0.5), (30, 5.0, 30.0, 0.5), (50, 1.0, 50.0, 1.0),
+                                        (200, 1.0, 50.0, 1.0), (120, 3.0, 8.0, 2.0)])
+def test_lccdf_matches_tail_sum(y, r, a, b):
+    # far in the upper tail 1 - CDF rounds off, down to -inf
+    assert beta_neg_binomial_lccdf(y, r, a, b) == pytest.approx(upper_tail(y, r, a, b), rel=1e-9)
+
+def test_lccdf_complements_lcdf():
+    rng = np.random.default_rng(5)
+    y = rng.integers(-1, 300, 2000)
+    r, a, b = rng.gamma(2, 2, y.size), rng.gamma(2, 5, y.size), rng.gamma(1, 1, y.size)
+    lccdf = beta_neg_binomial_lccdf(y, r, a, b)
+    assert np.all(np.isfinite(lccdf))
+    np.testing.assert_allclose(np.logaddexp(beta_neg_binomial_lcdf(y, r, a, b), lccdf), 0.0, atol=1e-9)
+    assert np.all(lccdf[y < 0] == 0)
+
+def test_lccdf_broadcasts():
+    y, r = np.array([[0, 30, 60]]), np.array([[5.0], [1.0]])
+    lccdf = beta_neg_binomial_lccdf(y, r, 30.0, 0.5)
+    assert lccdf.shape == (2, 3)
+    assert lccdf[0, 1] == pytest.approx(upper_tail(30, 5.0, 30.0, 0.5), rel=1e-9)
+    np.testing.assert_allclose(beta_neg_binomial_ccdf(y, r, 30.0, 0.5), np.exp(lccdf))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy import stats
+from scipy.special import logsumexp
+
+numba = pytest.importorskip("numba")
+# forked process pools of the later tests, e.g. of bootstrap, hang on exit once TBB threads were started
+numba.config.THREADING_LAYER = "workqueue"
+from bnb_numba import (beta_neg_binomial_lpmf, beta_neg_binomial_lcdf, beta_neg_binomial_lccdf,
+                       beta_neg_binomial_rng)
+from utils import beta_neg_binomial_pmf, beta_neg_binomial_lcdf as np_lcdf, beta_neg_binomial_lpmf_table
+from utils import beta_negative_binomial_rng
+
+
+@pytest.fixture(scope="module")
+def params():
+    rng = np.random.default_rng(1234)
+    n = rng.integers(0, 300, 10000)
+    return n, rng.gamma(2, 2, n.size), rng.gamma(2, 1, n.size), rng.gamma(1, 1, n.size)
+
+def upper_tail(n, r, alpha, beta, n_terms=200000):
+    """
+    log P(Y > n) as the sum of the PMF from n + 1 over `n_terms` terms, for tails that decay fast.
+    """
+    return logsumexp(beta_neg_binomial_lpmf_table(n + n_terms, r, alpha, beta)[n + 1:])
+
+def test_lpmf_matches_numpy(params):
+    n, r, alpha, beta = params
+    lpmf = beta_neg_binomial_lpmf(n, r, alpha, beta, pointwise=True)
+    np.testing.assert_allclose(lpmf, np.log(beta_neg_binomial_pmf(n, r, alpha, beta)), rtol=1e-8)
+    assert beta_neg_binomial_lpmf(n, r, alpha, beta) == pytest.approx(lpmf.sum())
+
+def test_lcdf_matches_numpy(params):
+    n, r, alpha, beta = params
+    np.testing.assert_allclose(beta_neg_binomial_lcdf(n, r, alpha, beta, pointwise=True),
+                               np_lcdf(n, r, alpha, beta), rtol=1e-8, atol=1e-12)
+
+@pytest.mark.parametrize("n, r, alpha, beta", [(5, 6.0, 12.0, 0.5), (30, 5.0, 30.0, 0.5), (50, 1.0, 50.0, 1.0),
+                                               (200, 1.0, 50.0, 1.0), (120, 3.0, 8.0, 2.0)])
+def test_lccdf_matches_tail_sum(n, r, alpha, beta):
+    # far in the upper tail 1 - CDF rounds to zero, so the tail has to be summed
+    assert beta_neg_binomial_lccdf(n, r, alpha, beta) == pytest.approx(upper_tail(n, r, alpha, beta), rel=1e-9)
+
+def test_lccdf_complements_lcdf(params):
+    n, r, alpha, beta = params
+    lccdf = beta_neg_binomial_lccdf(n, r, alpha, beta, pointwise=True)
+    lcdf = np_lcdf(n, r, alpha, beta)
+    assert np.all(np.isfinite(lccdf))
+    np.testing.assert_allclose(np.logaddexp(lcdf, lccdf), 0.0, atol=1e-9)
+    assert beta_neg_binomial_lccdf(-1, 1.0, 2.0, 3.0) == 0.0
+
+def test_rng_matches_numpy():
+    # the numba rng and the NumPy rng in utils sample the same mixture; compare the empirical distributions
+    samples = beta_neg_binomial_rng(np.full(100000, 6.0), 2.0, 0.5, seed=1234)
+    samples_numpy = beta_negative_binomial_rng(r=6, alpha=2, beta=0.5, size=100000, seed=1234)
+    assert stats.ks_2samp(samples, samples_numpy).pvalue > 1e-3
+    assert isinstance(beta_neg_binomial_rng(6.0, 2.0, 0.5, seed=1), int)
+
+@pytest.mark.parametrize("seed", [1, None])
+def test_rng_rejects_underflowing_p(seed):
+    # p ~ Beta(0.02, 0.5) is often zero in double precision
+    with pytest.raises(Exception, match="too large"):
+        beta_neg_binomial_rng(np.full(1000, 1.0), 0.02, 0.5, seed=seed)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from utils import beta_negative_binomial_rng, beta_negative_binomial_rng_chunks
+
+
+def bnb_moments(r, alpha, beta):
+    """
+    Mean and variance of the BNB distribution of numpy's negative_binomial(r, p) with p ~ Beta(alpha, beta).
+    """
+    mean = r * beta / (alpha - 1)
+    var = r * beta * (r + alpha - 1) * (beta + alpha - 1) / ((alpha - 2) * (alpha - 1)**2)
+    return mean, var
+
+@pytest.mark.parametrize("draw", [
+    lambda n, r, alpha, beta: beta_negative_binomial_rng(np.full(n, r), alpha, beta, seed=3),
+    lambda n, r, alpha, beta: beta_negative_binomial_rng(r, alpha, beta, size=n, seed=3),
+    lambda n, r, alpha, beta: np.concatenate(list(
+        beta_negative_binomial_rng_chunks(np.full(n, r), alpha, beta, chunk_size=30000, seed=3))),
+])
+def test_bnb_rng_dispersion(draw):
+    # an array r with scalar alpha, beta needs one beta draw per sample, not one shared by all
+    n, r, alpha, beta = 200000, 6.0, 8.0, 3.0
+    samples = draw(n, r, alpha, beta)
+    mean, var = bnb_moments(r, alpha, beta)
+    assert samples.shape == (n,)
+    assert abs(samples.mean() - mean) < 5 * np.sqrt(var / n)
+    assert abs(samples.var() / var - 1) < 0.05
+
+def test_bnb_rng_shapes():
+    assert isinstance(beta_negative_binomial_rng(6.0, 2.0, 0.5, seed=1), int)
+    assert beta_negative_binomial_rng(6.0, 2.0, 0.5, size=3, seed=1).shape == (3,)
+    assert beta_negative_binomial_rng([6.0, 7.0], 2.0, 0.5, size=(4, 2), seed=1).shape == (4, 2)
+    assert beta_negative_binomial_rng(np.ones((3, 1)), np.ones(5) * 2, 0.5, seed=1).shape == (3, 5)
+
+def test_bnb_rng_rejects_underflowing_p():
+    # p ~ Beta(0.02, 0.5) is often zero in double precision
+    with pytest.raises(Exception, match="too small for a finite sample"):
+        beta_negative_binomial_rng(1.0, 0.02, 0.5, size=1000, seed=1)
+    with pytest.raises(Exception, match="too small for a finite sample"):
+        np.concatenate(list(beta_negative_binomial_rng_chunks(1.0, 0.02, 0.5, size=1000, chunk_size=300, seed=1)))
+    # small but finite draws of p are still sampled
+    assert np.all(beta_negative_binomial_rng(1.0, 0.5, 0.5, size=10000, seed=1) >= 0)
@@ -0,0 +1,101 @@
+import os
+import glob
+import shlex
+import shutil
+import subprocess
+import numpy as np
+import pytest
+from scipy import integrate, special
+
+from utils import bnb_var_components, trunc_nb_mean
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (a, rho, k) covering light and heavy prior tails, with y_max = 50
+PARAMS = [(0.5, 3.0, 1.5), (2.0, 1.2, 0.8), (1.0, 6.0, 2.5), (0.2, 0.6, 1.0), (3.0, 9.0, 0.7)]
+Y_MAX = 50
+
+
+def integrated_var_nu_E_Y(a, rho, k, y_max, upper):
+    """
+    Var(E[Y | nu]) by adaptive integration over nu in [0, upper], as the integrate_1d version did,
+    with nu / a ~ Beta-prime(k, rho) and a tight tolerance.
+    """
+    def density(nu):
+        x = nu / a
+        return np.exp((k - 1) * np.log(x) - (k + rho) * np.log1p(x) - special.betaln(k, rho)) / a
+
+    breaks = [0, 1, 100, 1e4, upper]
+    moments = []
+    for power in (1, 2):
+        moments.append(sum(integrate.quad(lambda nu: trunc_nb_mean(a, nu, y_max)**power * density(nu),
+                                          lo, hi, epsabs=0, epsrel=1e-9, limit=500)[0]
+                           for lo, hi in zip(breaks[:-1], breaks[1:])))
+    return moments[1] - moments[0]**2
+
+@pytest.mark.filterwarnings("ignore::scipy.integrate.IntegrationWarning")
+@pytest.mark.parametrize("a, rho, k", PARAMS)
+def test_var_nu_E_Y_matches_integrator(a, rho, k):
+    var = bnb_var_components(a, rho, k, Y_MAX)[2]
+    # the full integral over nu in [0, inf)
+    assert var == pytest.approx(integrated_var_nu_E_Y(a, rho, k, Y_MAX, np.inf), rel=1e-8)
+    # the old integrator stopped at nu = 1e5; only heavy prior tails (rho near 1 or below) lose mass there
+    if rho > 2:
+        assert var == pytest.approx(integrated_var_nu_E_Y(a, rho, k, Y_MAX, 1e5), rel=1e-8)
+
+# ---- C++ function, compiled against Stan Math when it is found ----
+
+def _stan_math_flags():
+    """
+    Compiler flags for Stan Math: from STAN_MATH_CXXFLAGS, e.g. '-I<include> ... -L<tbb> -ltbb', or from the
+    libraries bundled with CmdStan. None if neither is available.
+    """
+    if os.environ.get("STAN_MATH_CXXFLAGS"):
+        return shlex.split(os.environ["STAN_MATH_CXXFLAGS"])
+    try:
+        from cmdstanpy import cmdstan_path
+        math = os.path.join(cmdstan_path(), "stan", "lib", "stan_math")
+    except Exception:
+        return None
+    lib = os.path.join(math, "lib")
+    includes = [math] + [path for pattern in ("eigen_*", "boost_*", "sundials_*/include", "tbb_*/include")
+                         for path in glob.glob(os.path.join(lib, pattern))]
+    tbb = os.path.join(lib, "tbb")
+    return [f"-I{path}" for path in includes] + [f"-L{tbb}", "-ltbb", f"-Wl,-rpath,{tbb}"]
+
+CPP_MAIN = """
+#include <iostream>
+#include <iomanip>
+#include <bnb_var_components.hpp>
+
+int main() {
+  double a, rho, k;
+  std::cout << std::setprecision(17);
+  while (std::cin >> a >> rho >> k) {
+    // the second call uses the cached rule
+    for (int call = 0; call < 2; call++) {
+      std::cout << bnb_gp_awgtr_model_namespace::bnb_var_nu_E_Y(a, rho, k, %d, 64, &std::cout) << " ";
+    }
+    std::cout << std::endl;
+  }
+}
+""" % Y_MAX
+
+def test_cpp_var_nu_E_Y_matches_python(tmp_path):
+    flags = _stan_math_flags()
+    compiler = shutil.which(os.environ.get("CXX", "g++"))
+    if flags is None or compiler is None:
+        pytest.skip("Stan Math or a C++ compiler not found")
+    (tmp_path / "main.cpp").write_text(CPP_MAIN)
+    exe = str(tmp_path / "main")
+    subprocess.run([compiler, "-std=c++17", "-O1", "-w", "-D_REENTRANT", "-DBOOST_DISABLE_ASSERTS",
+                    f"-I{os.path.join(REPO, 'src', 'cpp', 'bnb')}", str(tmp_path / "main.cpp"), "-o", exe] + flags,
+                   check=True)
+    # the rules of the first parameters are evicted and rebuilt once the cache is full
+    params = PARAMS + [(1.0, rho, 1.5) for rho in np.linspace(1.1, 20, 300)] + PARAMS
+    output = subprocess.run([exe], input="\n".join(" ".join(map(str, p)) for p in params),
+                            capture_output=True, text=True, check=True).stdout
+    values = np.array([line.split() for line in output.splitlines()], dtype=float)
+    assert np.array_equal(values[:, 0], values[:, 1])
+    expected = bnb_var_components(*np.array(params).T, Y_MAX)[:, 2]
+    np.testing.assert_allclose(values[:, 0], expected, rtol=1e-9)
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap import _bootstrap_task, bootstrap_fits
+from utils import beta_negative_binomial_rng, count_histogram
+
+
+def test_bnb_replicates_share_the_branch_of_the_estimate():
+    # r close to beta, where resampled fits land on either branch of the symmetric likelihood
+    values, counts = count_histogram(beta_negative_binomial_rng(1.2, 1.5, 1.2, size=800, seed=3))
+    estimate, boot_params, _, _ = _bootstrap_task(values, counts, 'bnb', n_boot=40, seed=7)
+    assert estimate[0] <= estimate[2]
+    assert np.all(boot_params[:, 0] <= boot_params[:, 2])
+
+def test_bootstrap_fits_intervals_cover_the_estimate():
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame({'grp': np.repeat(['a', 'b'], 300), 'y': rng.poisson(3.0, 600)})
+    params, gof = bootstrap_fits(df, 'y', 'grp', families=('poisson', 'bnb'), n_boot=20, seed=1, max_workers=1)
+    assert len(params) == 2 * (1 + 3) and len(gof) == 2 * 2
+    assert np.all((params['lower'] <= params['upper']))
+    poisson = params[params['family'] == 'poisson']
+    assert np.all((poisson['lower'] <= poisson['estimate']) & (poisson['estimate'] <= poisson['upper']))
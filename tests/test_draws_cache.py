@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from draws_cache import draws_cache
+from stan_csv import iter_stan_csv, read_stan_csv, split_variables, write_stan_csv
+from utils import merge_hdi, stan_model
+
+COLUMN_NAMES = ["lp__", "mu", "beta[1,1]", "beta[2,1]", "beta[1,2]", "beta[2,2]", "beta[1,3]", "beta[2,3]"]
+
+
+def write_chains(tmp_path, n_draws, prefix="fit"):
+    rng = np.random.default_rng(1)
+    csv_files = []
+    for chain, n in enumerate(n_draws):
+        path = str(tmp_path / f"{prefix}_{chain + 1}.csv")
+        write_stan_csv(path, rng.normal(size=(n, len(COLUMN_NAMES))), COLUMN_NAMES, "fit", chain_id=chain + 1)
+        csv_files.append(path)
+    return csv_files
+
+def test_write_chains_matches_write(tmp_path):
+    csv_files = write_chains(tmp_path, [40, 40, 40])
+    cache = draws_cache(str(tmp_path / "all"), csv_files)
+    cache.write(*read_stan_csv(csv_files, inc_warmup=True))
+    column_names, chains = iter_stan_csv(csv_files)
+    chained = draws_cache(str(tmp_path / "chained"), csv_files)
+    chained.write_chains(chains, column_names, len(csv_files))
+
+    assert draws_cache(str(tmp_path / "chained"), csv_files).valid
+    assert chained.manifest == cache.manifest
+    for name in ("lp__", "mu", "beta"):
+        assert np.array_equal(chained.columns(name), cache.columns(name))
+    assert chained.variable("beta").shape == (3, 40, 2, 3)
+
+def test_write_chains_rejects_uneven_chains(tmp_path):
+    csv_files = write_chains(tmp_path, [40, 30])
+    column_names, chains = iter_stan_csv(csv_files)
+    cache = draws_cache(str(tmp_path / "cache"), csv_files)
+    with pytest.raises(Exception, match="different numbers of draws"):
+        cache.write_chains(chains, column_names, len(csv_files))
+    assert not draws_cache(str(tmp_path / "cache"), csv_files).valid
+
+def test_stan_model_writes_the_cache_on_first_access(tmp_path):
+    csv_files = write_chains(tmp_path, [40, 40, 40], prefix="fit-20230825094535")
+    model = stan_model(str(tmp_path / "fit.stan"), recover=True, stan_data={}, stan_save_dir=str(tmp_path))
+    assert sorted(model.csv_files) == csv_files
+    assert not (tmp_path / ".draws_cache").exists()
+
+    beta = split_variables(*read_stan_csv(model.csv_files, max_workers=1)[:2])["beta"]
+    assert np.array_equal(model.stan_variable("beta"), beta.reshape(120, 2, 3))
+    assert draws_cache(str(tmp_path / ".draws_cache"), csv_files).valid
+    uncached = stan_model(str(tmp_path / "fit.stan"), recover=True, stan_data={}, stan_save_dir=str(tmp_path),
+                          use_cache=False)
+    assert uncached.cache is None
+    assert np.array_equal(uncached.stan_variable("beta"), model.stan_variable("beta"))
+
+    draws = model.draws_xr("beta")
+    assert draws["beta"].dims == ("chain", "draw", "beta_dim_0", "beta_dim_1")
+    assert merge_hdi(model, "beta").equals(merge_hdi(draws, "beta"))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from utils import (bnb_canonical_params, bnb_log_likelihood, bnb_mle_fit, beta_negative_binomial_rng, count_histogram,
+                   poi_mle_fit)
+
+
+def test_bnb_canonical_params_swaps_r_and_beta():
+    assert bnb_canonical_params(3.0, 2.0, 1.0) == (1.0, 2.0, 3.0)
+    assert bnb_canonical_params(1.0, 2.0, 3.0) == (1.0, 2.0, 3.0)
+    r, alpha, beta = bnb_canonical_params(np.array([3.0, 1.0]), np.array([2.0, 2.0]), np.array([1.0, 3.0]))
+    assert np.array_equal(r, [1.0, 1.0]) and np.array_equal(beta, [3.0, 3.0])
+
+@pytest.mark.parametrize("r, alpha, beta", [(0.7, 2.5, 2.6), (4.0, 3.0, 0.8), (1.2, 1.5, 1.2)])
+def test_bnb_mle_fit_returns_r_below_beta(r, alpha, beta):
+    # the likelihood is symmetric in r and beta, so both branches fit equally well
+    values, counts = count_histogram(beta_negative_binomial_rng(r, alpha, beta, size=5000, seed=11))
+    (r_mle, alpha_mle, beta_mle), se = bnb_mle_fit(values, counts, return_se=True)
+    assert r_mle <= beta_mle
+    assert bnb_log_likelihood(r_mle, alpha_mle, beta_mle, values, counts)[0] == pytest.approx(
+        bnb_log_likelihood(beta_mle, alpha_mle, r_mle, values, counts)[0])
+    assert np.all(np.isfinite(se))
+    assert bnb_mle_fit(values, counts) == (r_mle, alpha_mle, beta_mle)
+
+def test_poi_mle_fit_is_the_weighted_mean():
+    values, counts = np.array([0, 1, 2, 5, 40]), np.array([120.0, 80.0, 31.0, 7.0, 1.0])
+    mu, se = poi_mle_fit(values, counts, return_se=True)
+    assert mu == np.average(values, weights=counts)
+    assert se == pytest.approx(np.sqrt(mu / counts.sum()))
+    assert poi_mle_fit(np.repeat(values, counts.astype(int))) == pytest.approx(mu)
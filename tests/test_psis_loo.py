@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import arviz as az
+
+from psis_loo import chunked_loo
+from stan_csv import read_stan_csv, write_stan_csv
+
+COLUMN_NAMES = ["lp__", "mu"] + [f"log_lik[{i}]" for i in range(1, 6)]
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_chunked_loo_from_csv_matches_loo(tmp_path):
+    rng = np.random.default_rng(2)
+    csv_files = []
+    for chain in range(2):
+        path = str(tmp_path / f"fit_{chain + 1}.csv")
+        draws = np.column_stack([rng.normal(size=(200, 2)), rng.normal(-1.0, 0.5, size=(200, 5))])
+        write_stan_csv(path, draws, COLUMN_NAMES, "fit", chain_id=chain + 1)
+        csv_files.append(path)
+    # cells 3, 1, 1, 5 of log_lik, after lp__, accept_stat__ and mu
+    cells = np.array([2, 0, 0, 4])
+    log_lik, _, _ = read_stan_csv(csv_files, vars=["log_lik"])
+    expected = az.loo(az.from_dict(log_likelihood={"log_lik": log_lik[..., cells]}), pointwise=True, reff=1.0)
+
+    elpd = chunked_loo(csv_files, cells + 3, chunk_size=3, max_workers=1)
+    assert elpd["n_data_points"] == len(cells)
+    np.testing.assert_allclose(elpd["loo_i"].values, expected["loo_i"].values, rtol=1e-6)
+    assert elpd["elpd_loo"] == pytest.approx(expected["elpd_loo"], rel=1e-6)
+    assert elpd["p_loo"] == pytest.approx(expected["p_loo"], rel=1e-4)
@@ -0,0 +1,22 @@
+import types
+import numpy as np
+import pandas as pd
+
+from sharded_gq import _data_key, _model_key
+
+
+def test_data_key_follows_the_data():
+    stan_data = {"N": np.int64(3), "y": np.arange(3), "w": pd.Series([0.5, 1.5]), "x": [[1, 2], [3, 4]]}
+    assert _data_key(stan_data) == _data_key(dict(reversed(list(stan_data.items()))))
+    assert _data_key(stan_data) == _data_key({**stan_data, "y": [0, 1, 2]})
+    assert _data_key(stan_data) != _data_key({**stan_data, "y": np.arange(1, 4)})
+
+def test_model_key_follows_the_build(tmp_path):
+    exe_file = tmp_path / "gen"
+    exe_file.write_bytes(b"model")
+    built = types.SimpleNamespace(build={"hash": "abc"}, model=types.SimpleNamespace(exe_file=str(exe_file)))
+    assert _model_key(built) == "abc"
+    loaded = types.SimpleNamespace(model=types.SimpleNamespace(exe_file=str(exe_file)))
+    key = _model_key(loaded)
+    exe_file.write_bytes(b"rebuilt model")
+    assert _model_key(loaded) != key
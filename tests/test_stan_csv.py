@@ -0,0 +1,33 @@
+import numpy as np
+
+from stan_csv import read_sampler_stats, read_stan_csv
+
+SAMPLER_COLUMNS = ["lp__", "accept_stat__", "stepsize__", "treedepth__", "n_leapfrog__", "divergent__", "energy__"]
+
+
+def write_nuts_csv(path, n_warmup, n_draws, seed):
+    """
+    Write a CSV file laid out as by the NUTS sampler with save_warmup = 1.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.column_stack([rng.normal(size=n_warmup + n_draws), rng.uniform(size=n_warmup + n_draws),
+                            np.full(n_warmup + n_draws, 0.5), rng.integers(1, 11, size=n_warmup + n_draws),
+                            rng.integers(1, 1024, size=n_warmup + n_draws), rng.integers(0, 2, size=n_warmup + n_draws),
+                            rng.normal(size=n_warmup + n_draws), rng.normal(size=(n_warmup + n_draws, 3))])
+    lines = ["# model = fit_model", "#     save_warmup = 1", ",".join(SAMPLER_COLUMNS + ["mu", "beta.1", "beta.2"])]
+    lines += [",".join(f"{x:g}" for x in row) for row in rows[:n_warmup]]
+    lines += ["# Adaptation terminated", "# Step size = 0.5", "# Diagonal elements of inverse mass matrix:", "# 1, 1, 1"]
+    lines += [",".join(f"{x:g}" for x in row) for row in rows[n_warmup:]]
+    lines += ["# ", "#  Elapsed Time: 0.1 seconds (Warm-up)", "#                0.1 seconds (Sampling)"]
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+def test_read_sampler_stats_matches_read_stan_csv(tmp_path):
+    path = str(tmp_path / "fit_1.csv")
+    write_nuts_csv(path, n_warmup=15, n_draws=40, seed=4)
+    stats, n_warmup = read_sampler_stats(path)
+    draws, column_names, expected_warmup = read_stan_csv([path], vars=SAMPLER_COLUMNS, inc_warmup=True, max_workers=1)
+    assert n_warmup == expected_warmup == 15
+    assert list(stats) == column_names == SAMPLER_COLUMNS
+    for i, name in enumerate(column_names):
+        assert np.array_equal(stats[name], draws[0, :, i])